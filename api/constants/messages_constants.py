@@ -11,8 +11,11 @@ API_ERROR_SEM_PERMISSAO = "permission_denied"
 # =========================
 
 API_ERROR_AGENDAMENTO_FINALIZADO = "Agendamento finalizado não pode ser alterado."
+API_ERROR_AGENDAMENTO_COM_HISTORICO = "Agendamento com histórico não pode ser excluído."
+API_ERROR_JA_POSSUI_CONSULTA_FUTURA = "Você já possui uma consulta futura marcada."
 API_ERROR_STATUS_PERMISSION = "Você não pode alterar o status."
 API_ERROR_OUTRO_MEDICO = "Você não pode alterar agendamento de outro médico."
+API_ERROR_HORARIO_FORA_DA_GRADE = "Horário fora da grade de atendimento."
 API_ERROR_AGENDAMENTO_PASSADO = (
     "Não é permitido criar consulta para agendamento no passado."
 )
@@ -25,3 +28,9 @@ API_ERROR_STATUS_NAO_REALIZADO = (
 API_ERROR_ARQUIVO_MAX_SIZE = "Arquivo excede o tamanho máximo de 6MB."
 API_ERROR_ARQUIVO_NAO_PDF = "A receita deve ser PDF."
 API_ERROR_ARQUIVO_TIPO_INVALIDO = "Tipo inválido."
+API_ERROR_FORMATO_EXPORTACAO = "Formato inválido. Use zip ou pdf."
+API_ERROR_MES_EXPORTACAO = "Mês inválido. Use o formato AAAA-MM."
+API_ERROR_PACIENTE_EXPORTACAO = "Paciente inválido."
+API_ERROR_LIMITE_EXPORTACAO_PDF = (
+    "Muitas receitas para um único PDF (máximo {limite}). Exporte em ZIP."
+)
@@ -10,12 +10,15 @@ from api.constants import (
     API_ERROR_ARQUIVO_TIPO_INVALIDO,
     API_ERROR_CONSULTA_EXISTENTE,
     API_ERROR_CONSULTA_OUTRO_MEDICO,
+    API_ERROR_HORARIO_FORA_DA_GRADE,
+    API_ERROR_JA_POSSUI_CONSULTA_FUTURA,
     API_ERROR_OUTRO_MEDICO,
     API_ERROR_STATUS_NAO_REALIZADO,
     API_ERROR_STATUS_PERMISSION,
     API_RECEITA_MAX_SIZE,
 )
 from gmp.consultas.models import AgendamentoConsulta, Consulta
+from gmp.consultas.utils.grade_horarios import esta_na_grade
 from gmp.usuarios.models import CustomUser
 
 
@@ -103,10 +106,24 @@ class AgendamentoConsultaSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(API_ERROR_AGENDAMENTO_FINALIZADO)
         return super().update(instance, validated_data)
 
+    def validate_data_hora(self, value):
+        if not esta_na_grade(value):
+            raise serializers.ValidationError(API_ERROR_HORARIO_FORA_DA_GRADE)
+        return value
+
     def validate(self, data):
         request = self.context.get("request")
         user = request.user
 
+        # Mesma regra do formulário: o ponteiro da próxima consulta só é a
+        # próxima consulta enquanto o paciente tiver no máximo uma futura.
+        if (
+            self.instance is None
+            and user.role == CustomUser.ROLE_PACIENTE
+            and user.possui_consulta_futura()
+        ):
+            raise serializers.ValidationError(API_ERROR_JA_POSSUI_CONSULTA_FUTURA)
+
         if "status" in data:
             if user.role not in [CustomUser.ROLE_MEDICO, CustomUser.ROLE_SUPERADM]:
                 raise serializers.ValidationError(API_ERROR_STATUS_PERMISSION)
@@ -136,6 +153,7 @@ class ConsultaSerializer(serializers.ModelSerializer):
             "data_geracao_receita",
             "receita_pdf",
         ]
+        read_only_fields = ["data_geracao_receita", "receita_pdf"]
 
     def validate(self, data):
         agendamento = data.get("agendamento")
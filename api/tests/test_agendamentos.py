@@ -4,8 +4,9 @@ import pytest
 from django.urls import reverse
 from django.utils import timezone
 
+from api.constants import API_ERROR_AGENDAMENTO_COM_HISTORICO
 from gmp.consultas.constants import STATUS_LABEL_MARCADA
-from gmp.consultas.models import AgendamentoConsulta
+from gmp.consultas.models import AgendamentoConsulta, ConsultaLog
 
 
 @pytest.mark.django_db
@@ -75,3 +76,71 @@ class TestAgendamento:
 
         assert response.status_code == 200
         assert len(response.data) == 0
+
+    def test_horario_fora_da_grade_e_rejeitado(self, api_client, paciente, medico):
+
+        api_client.force_authenticate(user=paciente)
+
+        data_hora = timezone.make_aware(datetime.datetime(2030, 1, 1, 10, 15, 0))
+
+        response = api_client.post(
+            reverse("agendamentos-list"),
+            {
+                "medico": medico.id,
+                "data_hora": data_hora.isoformat(),
+            },
+        )
+
+        assert response.status_code == 400
+        assert AgendamentoConsulta.objects.count() == 0
+
+    def test_delete_cancela_agendamento_marcado(self, api_client, paciente, medico):
+
+        api_client.force_authenticate(user=paciente)
+
+        response = api_client.post(
+            reverse("agendamentos-list"),
+            {
+                "medico": medico.id,
+                "data_hora": timezone.make_aware(
+                    datetime.datetime(2030, 1, 1, 10, 0, 0)
+                ).isoformat(),
+            },
+        )
+        url = reverse("agendamentos-detail", args=[response.data["id"]])
+
+        response = api_client.delete(url)
+
+        assert response.status_code == 204
+
+        agendamento = AgendamentoConsulta.objects.get()
+        assert agendamento.status == AgendamentoConsulta.STATUS_CANCELADA
+        assert agendamento.cancelado_por == paciente
+        assert ConsultaLog.objects.filter(
+            consulta=agendamento, status_novo=AgendamentoConsulta.STATUS_CANCELADA
+        ).exists()
+
+        response = api_client.delete(url)
+
+        assert response.status_code == 400
+        assert response.data == [API_ERROR_AGENDAMENTO_COM_HISTORICO]
+
+    def test_delete_remove_agendamento_sem_historico(
+        self, api_client, superadm, paciente, medico
+    ):
+
+        agendamento = AgendamentoConsulta.objects.create(
+            paciente=paciente,
+            medico=medico,
+            data_hora=timezone.make_aware(datetime.datetime(2030, 1, 1, 10, 0, 0)),
+            status=AgendamentoConsulta.STATUS_CANCELADA,
+        )
+
+        api_client.force_authenticate(user=superadm)
+
+        response = api_client.delete(
+            reverse("agendamentos-detail", args=[agendamento.id])
+        )
+
+        assert response.status_code == 204
+        assert not AgendamentoConsulta.objects.exists()
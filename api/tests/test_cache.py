@@ -0,0 +1,118 @@
+import threading
+import time
+
+import pytest
+from django.core.cache import cache
+from django.db import connection
+
+from gmp.consultas.constants import CACHE_TIMEOUT_HORARIOS, CACHE_TIMEOUT_LOCAL
+from gmp.consultas.services.cache_service import (
+    obter_ou_calcular,
+    set_cache,
+    timeout_compartilhado,
+)
+from gmp.consultas.services.horarios_service import horarios_disponiveis_service
+from gmp.consultas.utils.grade_horarios import HORARIOS_FORMATADOS
+
+TOTAL_THREADS = 8
+
+
+@pytest.fixture(autouse=True)
+def limpar_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+def executar_em_paralelo(funcao, total=TOTAL_THREADS):
+
+    barreira = threading.Barrier(total)
+    resultados = []
+    erros = []
+
+    def alvo():
+        try:
+            barreira.wait()
+            resultados.append(funcao())
+        except Exception as e:
+            erros.append(e)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=alvo) for _ in range(total)]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    assert not erros
+    return resultados
+
+
+class TestRecalculoSingleFlight:
+
+    def test_um_unico_worker_recalcula_no_cache_frio(self):
+        chamadas = []
+
+        def calcular():
+            chamadas.append(1)
+            time.sleep(0.05)
+            return "valor"
+
+        resultados = executar_em_paralelo(
+            lambda: obter_ou_calcular("chave", calcular, 60)
+        )
+
+        assert len(chamadas) == 1
+        assert resultados == ["valor"] * TOTAL_THREADS
+
+    def test_demais_workers_recebem_valor_anterior(self):
+        set_cache("chave", ("anterior", time.time() - 1, 0.0), 60)
+        chamadas = []
+
+        def calcular():
+            chamadas.append(1)
+            time.sleep(0.05)
+            return "novo"
+
+        resultados = executar_em_paralelo(
+            lambda: obter_ou_calcular("chave", calcular, 60)
+        )
+
+        assert len(chamadas) == 1
+        assert resultados.count("novo") == 1
+        assert resultados.count("anterior") == TOTAL_THREADS - 1
+
+
+@pytest.mark.django_db(transaction=True)
+class TestStampedeHorarios:
+
+    def test_threads_concorrentes_fazem_uma_unica_consulta(self, medico):
+        consultas = []
+
+        def contar(execute, sql, params, many, context):
+            if "consultas_agendamentoconsulta" in sql:
+                consultas.append(sql)
+                time.sleep(0.05)
+            return execute(sql, params, many, context)
+
+        def buscar():
+            with connection.execute_wrapper(contar):
+                return horarios_disponiveis_service(medico.id, "2030-01-01")
+
+        resultados = executar_em_paralelo(buscar)
+
+        assert len(consultas) == 1
+        assert all(len(r) == len(HORARIOS_FORMATADOS) for r in resultados)
+
+
+def test_cache_local_usa_timeout_curto(settings):
+    assert timeout_compartilhado(CACHE_TIMEOUT_HORARIOS) == CACHE_TIMEOUT_LOCAL
+
+    settings.CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}
+    }
+
+    assert timeout_compartilhado(CACHE_TIMEOUT_HORARIOS) == CACHE_TIMEOUT_HORARIOS
@@ -0,0 +1,151 @@
+import datetime
+from io import StringIO
+from unittest import mock
+
+import pytest
+from django.core import mail
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+
+from gmp.consultas.constants import EMAIL_MAX_TENTATIVAS
+from gmp.consultas.forms import AgendamentoConsultaForm
+from gmp.consultas.models import AgendamentoConsulta, EmailSaida, LembreteConsulta
+from gmp.consultas.services import email_service
+from gmp.consultas.services.consulta_service import marcar_consulta_service
+from gmp.consultas.services.email_service import (
+    enfileirar_email,
+    enviar_mensagens,
+    fechar_conexao,
+    metricas_email,
+    processar_caixa_saida,
+)
+
+
+@pytest.mark.django_db
+class TestCaixaSaida:
+
+    def test_marcacao_enfileira_sem_enviar(self, paciente, medico):
+        form = AgendamentoConsultaForm(
+            {"medico": medico.id, "data": "2030-01-01", "hora": "10:00"},
+            user=paciente,
+        )
+        assert form.is_valid()
+
+        with mock.patch("django.core.mail.get_connection") as get_connection:
+            marcar_consulta_service(form, paciente)
+
+        get_connection.assert_not_called()
+        assert len(mail.outbox) == 0
+
+        call_command("enviar_emails", stdout=StringIO())
+
+        assert len(mail.outbox) == 1
+        assert mail.outbox[0].to == [paciente.email]
+        assert "2030-01-01 às 10:00" in mail.outbox[0].body
+        assert EmailSaida.objects.get().status == EmailSaida.STATUS_ENVIADO
+
+    def test_falha_reagenda_com_backoff(self):
+        email = enfileirar_email("paciente@test.com", "Assunto", "Mensagem")
+
+        with mock.patch(
+            "django.core.mail.backends.locmem.EmailBackend.send_messages",
+            side_effect=OSError("smtp indisponível"),
+        ):
+            assert processar_caixa_saida() == (0, 1)
+
+        email.refresh_from_db()
+        assert email.status == EmailSaida.STATUS_PENDENTE
+        assert email.tentativas == 1
+        assert email.proxima_tentativa_em > timezone.now()
+
+        assert processar_caixa_saida() == (0, 0)
+
+        EmailSaida.objects.update(tentativas=EMAIL_MAX_TENTATIVAS - 1)
+
+        with mock.patch(
+            "django.core.mail.backends.locmem.EmailBackend.send_messages",
+            side_effect=OSError("smtp indisponível"),
+        ):
+            processar_caixa_saida(agora=timezone.now() + datetime.timedelta(days=1))
+
+        email.refresh_from_db()
+        assert email.status == EmailSaida.STATUS_FALHOU
+
+
+@pytest.mark.django_db
+class TestDespachoEmail:
+
+    def test_conexao_reaproveitada_entre_envios(self, client, paciente):
+        fechar_conexao()
+        antes = metricas_email()
+
+        with mock.patch(
+            "gmp.consultas.services.email_service.get_connection",
+            wraps=mail.get_connection,
+        ) as get_connection:
+            for indice in range(3):
+                enfileirar_email(paciente.email, f"Assunto {indice}", "Mensagem")
+                processar_caixa_saida()
+
+            client.post(reverse("pw_reset"), {"email": paciente.email})
+
+        depois = metricas_email()
+
+        assert get_connection.call_count == 1
+        assert len(mail.outbox) == 4
+        assert depois["mensagens_enviadas"] - antes["mensagens_enviadas"] == 4
+
+    def test_falha_de_conexao_afeta_todo_o_lote(self):
+        fechar_conexao()
+
+        with mock.patch(
+            "gmp.consultas.services.email_service.get_connection",
+            side_effect=OSError("smtp indisponível"),
+        ):
+            falhas = enviar_mensagens([mail.EmailMessage(to=["a@test.com"])] * 2)
+
+        assert [indice for indice, _ in falhas] == [0, 1]
+
+    def test_redefinicao_de_senha_registra_falha_e_fecha_conexao(
+        self, client, paciente, caplog
+    ):
+        fechar_conexao()
+
+        with mock.patch(
+            "gmp.consultas.services.email_service.get_connection",
+            side_effect=OSError("smtp indisponível"),
+        ):
+            client.post(reverse("pw_reset"), {"email": paciente.email})
+
+        assert f"@{paciente.email.rpartition('@')[2]}" in caplog.text
+        assert "smtp indisponível" in caplog.text
+
+        client.post(reverse("pw_reset"), {"email": paciente.email})
+
+        assert email_service._local.conexao is None
+
+
+@pytest.mark.django_db
+class TestLembretes:
+
+    def test_lembretes_enviados_uma_unica_vez(self, paciente, paciente2, medico):
+        agora = timezone.now()
+
+        lembrada = AgendamentoConsulta.objects.create(
+            paciente=paciente,
+            medico=medico,
+            data_hora=agora + datetime.timedelta(hours=3),
+        )
+        AgendamentoConsulta.objects.create(
+            paciente=paciente2,
+            medico=medico,
+            data_hora=agora + datetime.timedelta(days=3),
+        )
+
+        call_command("enviar_lembretes", lote=1, stdout=StringIO())
+        call_command("enviar_lembretes", stdout=StringIO())
+
+        assert len(mail.outbox) == 1
+        assert mail.outbox[0].to == [paciente.email]
+        assert LembreteConsulta.objects.get().agendamento == lembrada
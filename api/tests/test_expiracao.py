@@ -0,0 +1,102 @@
+import datetime
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+
+from gmp.consultas.models import (
+    AgendamentoConsulta,
+    ConsultaLog,
+    ContadorDiarioMedico,
+)
+from gmp.consultas.services.contador_service import marcadas_no_dia
+from gmp.consultas.services.expiracao_service import PRAZO_REGISTRO, AgendaExpiracao
+
+AGORA = timezone.now()
+
+
+def criar_agendamento(paciente, medico, data_hora):
+    agendamento = AgendamentoConsulta.objects.create(
+        paciente=paciente, medico=medico, data_hora=data_hora
+    )
+    contador, _ = ContadorDiarioMedico.objects.get_or_create(
+        medico=medico, dia=timezone.localdate(data_hora)
+    )
+    contador.marcadas += 1
+    contador.save()
+    return agendamento
+
+
+@pytest.mark.django_db
+class TestExpiracaoConsultas:
+
+    def test_expira_em_lotes_e_registra_logs(
+        self, paciente, paciente2, medico, django_capture_on_commit_callbacks
+    ):
+        vencidas = [
+            criar_agendamento(paciente, medico, AGORA - datetime.timedelta(days=3)),
+            criar_agendamento(paciente2, medico, AGORA - datetime.timedelta(days=2)),
+        ]
+        recente = criar_agendamento(
+            paciente, medico, AGORA - datetime.timedelta(hours=1)
+        )
+        dia = timezone.localdate(vencidas[0].data_hora)
+
+        with django_capture_on_commit_callbacks(execute=True) as callbacks:
+            call_command("atualizar_consultas", lote=1, stdout=StringIO())
+
+        for agendamento in vencidas:
+            agendamento.refresh_from_db()
+            assert agendamento.status == AgendamentoConsulta.STATUS_NAO_REALIZADA
+
+        recente.refresh_from_db()
+        assert recente.status == AgendamentoConsulta.STATUS_MARCADA
+
+        assert (
+            ConsultaLog.objects.filter(
+                status_novo=AgendamentoConsulta.STATUS_NAO_REALIZADA
+            ).count()
+            == 2
+        )
+        assert marcadas_no_dia(medico.id, dia) == 0
+        # Dois lotes, cada um invalidando ocupações e timelines após o commit.
+        assert len(callbacks) == 4
+
+    def test_sem_consultas_vencidas(self):
+        assert AgendamentoConsulta.atualizar_consultas_expiradas() == 0
+
+
+@pytest.mark.django_db
+class TestAgendaExpiracao:
+
+    def test_heap_expira_no_prazo_e_acompanha_alteracoes(
+        self, paciente, paciente2, medico
+    ):
+        agora = timezone.now()
+
+        primeira = criar_agendamento(
+            paciente, medico, agora - PRAZO_REGISTRO + datetime.timedelta(hours=1)
+        )
+
+        agenda = AgendaExpiracao()
+        agenda.carregar(agora)
+
+        assert len(agenda) == 1
+        assert agenda.expirar_vencidas(agora) == 0
+        assert agenda.segundos_ate_proximo(agora) > 0
+
+        segunda = criar_agendamento(
+            paciente2, medico, agora - PRAZO_REGISTRO + datetime.timedelta(minutes=30)
+        )
+        primeira.status = AgendamentoConsulta.STATUS_CANCELADA
+        primeira.save()
+
+        agenda.sincronizar(agora)
+
+        assert len(agenda) == 2
+        assert agenda.expirar_vencidas(agora + datetime.timedelta(hours=2)) == 1
+
+        segunda.refresh_from_db()
+        assert segunda.status == AgendamentoConsulta.STATUS_NAO_REALIZADA
+        assert len(agenda) == 0
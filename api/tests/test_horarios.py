@@ -0,0 +1,201 @@
+import datetime
+from io import StringIO
+
+import pytest
+from django.core.cache import cache
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+
+from gmp.consultas.models import AgendamentoConsulta
+from gmp.consultas.selectors import agenda_medico_com_filtros, intervalo_local
+from gmp.consultas.services.cache_service import (
+    atualizar_ocupacao,
+    invalidar_namespace,
+)
+from gmp.consultas.services.horarios_service import horarios_disponiveis_service
+from gmp.consultas.utils.cache_keys import dia_namespace
+from gmp.consultas.utils.grade_horarios import (
+    HORARIOS_FORMATADOS,
+    MASCARA_COMPLETA,
+    horarios_da_mascara,
+    instante_do_horario,
+    mascara_antecedencia,
+)
+
+DATA = datetime.date(2030, 1, 1)
+DATA_STR = DATA.isoformat()
+
+
+@pytest.fixture(autouse=True)
+def limpar_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+class TestGradeHorarios:
+
+    def test_mascara_completa_retorna_todos_os_horarios(self):
+        assert horarios_da_mascara(MASCARA_COMPLETA) == HORARIOS_FORMATADOS
+
+    def test_antecedencia_no_mesmo_dia_descarta_horarios_anteriores(self):
+        minimo = timezone.make_aware(datetime.datetime(2030, 1, 1, 10, 0, 30))
+
+        horarios = horarios_da_mascara(mascara_antecedencia(DATA, minimo))
+
+        assert horarios[0] == "10:30"
+        assert "10:00" not in horarios
+
+    def test_instante_do_horario_usa_fuso_local(self):
+        esperado = timezone.make_aware(datetime.datetime(2030, 1, 1, 8, 30))
+
+        assert instante_do_horario(DATA, "08:30") == esperado
+        assert instante_do_horario(DATA, "08:15") is None
+
+
+@pytest.mark.django_db
+class TestHorariosDisponiveis:
+
+    def test_horario_marcado_nao_aparece(self, medico, paciente):
+        AgendamentoConsulta.objects.create(
+            paciente=paciente,
+            medico=medico,
+            data_hora=timezone.make_aware(datetime.datetime(2030, 1, 1, 10, 0)),
+        )
+
+        horarios = horarios_disponiveis_service(medico.id, DATA_STR)
+
+        assert "10:00" not in horarios
+        assert len(horarios) == len(HORARIOS_FORMATADOS) - 1
+
+    def test_mascara_em_cache_acompanha_ocupacao(
+        self, medico, django_capture_on_commit_callbacks
+    ):
+        data_hora = timezone.make_aware(datetime.datetime(2030, 1, 1, 15, 30))
+
+        assert "15:30" in horarios_disponiveis_service(medico.id, DATA_STR)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            atualizar_ocupacao(medico.id, data_hora, ocupado=True)
+        assert "15:30" not in horarios_disponiveis_service(medico.id, DATA_STR)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            atualizar_ocupacao(medico.id, data_hora, ocupado=False)
+        assert "15:30" in horarios_disponiveis_service(medico.id, DATA_STR)
+
+    def test_cache_nao_muda_antes_do_commit(
+        self, medico, django_capture_on_commit_callbacks
+    ):
+        data_hora = timezone.make_aware(datetime.datetime(2030, 1, 1, 15, 30))
+
+        horarios_disponiveis_service(medico.id, DATA_STR)
+
+        with django_capture_on_commit_callbacks() as callbacks:
+            atualizar_ocupacao(medico.id, data_hora, ocupado=True)
+
+        assert "15:30" in horarios_disponiveis_service(medico.id, DATA_STR)
+        assert len(callbacks) == 1
+
+    def test_agendamento_pela_api_ocupa_horario(
+        self, api_client, paciente, medico, django_capture_on_commit_callbacks
+    ):
+        horarios_disponiveis_service(medico.id, DATA_STR)
+
+        api_client.force_authenticate(user=paciente)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            api_client.post(
+                reverse("agendamentos-list"),
+                {
+                    "medico": medico.id,
+                    "data_hora": timezone.make_aware(
+                        datetime.datetime(2030, 1, 1, 10, 0)
+                    ).isoformat(),
+                },
+            )
+
+        assert "10:00" not in horarios_disponiveis_service(medico.id, DATA_STR)
+
+    def test_invalidar_namespace_descarta_mascaras(self, medico, paciente):
+        horarios_disponiveis_service(medico.id, DATA_STR)
+
+        AgendamentoConsulta.objects.create(
+            paciente=paciente,
+            medico=medico,
+            data_hora=timezone.make_aware(datetime.datetime(2030, 1, 1, 11, 0)),
+        )
+
+        assert "11:00" in horarios_disponiveis_service(medico.id, DATA_STR)
+
+        invalidar_namespace(dia_namespace(DATA_STR))
+
+        assert "11:00" not in horarios_disponiveis_service(medico.id, DATA_STR)
+
+
+@pytest.mark.django_db
+class TestHorariosDisponiveisPeriodo:
+
+    def test_periodo_agrupa_por_medico_e_dia(
+        self, client, paciente, medico, django_assert_num_queries
+    ):
+        AgendamentoConsulta.objects.create(
+            paciente=paciente,
+            medico=medico,
+            data_hora=timezone.make_aware(datetime.datetime(2030, 1, 2, 9, 0)),
+        )
+
+        client.force_login(paciente)
+
+        with django_assert_num_queries(3):
+            response = client.get(
+                reverse("horarios_disponiveis_periodo"),
+                {"medicos": str(medico.id), "inicio": DATA_STR, "fim": "2030-01-05"},
+            )
+
+        horarios = response.json()[str(medico.id)]
+
+        assert response.status_code == 200
+        assert len(horarios["2030-01-01"]) == len(HORARIOS_FORMATADOS)
+        assert "09:00" not in horarios["2030-01-02"]
+        assert horarios["2030-01-05"] == []
+
+    def test_periodo_invalido(self, client, paciente, medico):
+        client.force_login(paciente)
+
+        response = client.get(
+            reverse("horarios_disponiveis_periodo"),
+            {"medicos": str(medico.id), "inicio": "2030-01-05", "fim": DATA_STR},
+        )
+
+        assert response.status_code == 400
+
+
+@pytest.mark.django_db
+class TestFiltroPorDia:
+
+    def test_intervalo_local_respeita_fuso(self):
+        inicio, fim = intervalo_local(DATA_STR)
+
+        assert inicio == timezone.make_aware(datetime.datetime(2030, 1, 1))
+        assert fim == timezone.make_aware(datetime.datetime(2030, 1, 2))
+
+    def test_agenda_filtra_por_dia_local(self, medico, paciente):
+        AgendamentoConsulta.objects.create(
+            paciente=paciente,
+            medico=medico,
+            data_hora=timezone.make_aware(datetime.datetime(2030, 1, 1, 22, 30)),
+        )
+
+        consultas = agenda_medico_com_filtros(medico, data=DATA_STR)
+
+        assert "django_datetime_cast_date" not in str(consultas.query)
+        assert consultas.count() == 1
+        assert not agenda_medico_com_filtros(medico, data="2030-01-02").exists()
+
+    def test_comando_compara_planos(self, medico):
+        saida = StringIO()
+
+        call_command("explicar_filtros_data", DATA_STR, repeticoes=1, stdout=saida)
+
+        assert "data_hora__date (antes)" in saida.getvalue()
@@ -0,0 +1,175 @@
+import datetime
+from unittest import mock
+
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from gmp.consultas.constants import CACHE_TIMEOUT_LOCAL
+from gmp.consultas.models import AgendamentoConsulta, ConsultaLog
+from gmp.consultas.selectors import intervalo_mes
+from gmp.consultas.services import log_service, timeline_service
+from gmp.consultas.services.arquivo_log_service import arquivar_logs, consultar_logs
+from gmp.consultas.services.consulta_service import cancelar_consulta_service
+from gmp.consultas.services.log_service import registrar_log, transacao_auditada
+
+
+def insercoes_de_log(contexto):
+    return [
+        q
+        for q in contexto.captured_queries
+        if q["sql"].startswith('INSERT INTO "consultas_consultalog"')
+    ]
+
+
+@pytest.fixture
+def agendamento(paciente, medico):
+    return AgendamentoConsulta.objects.create(
+        paciente=paciente,
+        medico=medico,
+        data_hora=timezone.make_aware(datetime.datetime(2030, 1, 1, 10, 0)),
+    )
+
+
+@pytest.mark.django_db
+class TestLogAuditoria:
+
+    def test_logs_da_transacao_gravados_numa_insercao(self, agendamento, medico):
+        with CaptureQueriesContext(connection) as contexto:
+            with transacao_auditada():
+                for status in ("a", "b", "c"):
+                    registrar_log(agendamento, medico, status, status)
+
+                assert ConsultaLog.objects.count() == 0
+
+        assert ConsultaLog.objects.count() == 3
+        assert len(insercoes_de_log(contexto)) == 1
+
+    def test_transacao_desfeita_descarta_logs(self, agendamento, medico):
+        with pytest.raises(RuntimeError):
+            with transacao_auditada():
+                registrar_log(agendamento, medico, "-", "marcada")
+                raise RuntimeError
+
+        assert ConsultaLog.objects.count() == 0
+
+    def test_cancelamento_grava_log_na_transacao(self, agendamento, paciente):
+        cancelar_consulta_service(agendamento, paciente)
+
+        assert ConsultaLog.objects.filter(
+            consulta=agendamento, status_novo=AgendamentoConsulta.STATUS_CANCELADA
+        ).exists()
+
+    def test_modo_assincrono_enfileira_apos_commit(
+        self, settings, django_capture_on_commit_callbacks, agendamento, paciente
+    ):
+        settings.CONSULTA_LOG_ASSINCRONO = True
+
+        with mock.patch.object(log_service, "_iniciar_trabalhador"):
+            with django_capture_on_commit_callbacks(execute=True):
+                cancelar_consulta_service(agendamento, paciente)
+
+        assert ConsultaLog.objects.count() == 0
+        assert log_service.gravar_fila(bloquear=False) == 1
+        assert ConsultaLog.objects.count() == 1
+
+
+@pytest.mark.django_db
+class TestArquivoLogs:
+
+    @pytest.fixture(autouse=True)
+    def media(self, settings, tmp_path):
+        settings.MEDIA_ROOT = tmp_path
+
+    @pytest.fixture
+    def logs(self, agendamento, medico):
+        for dia in ("2030-01-15", "2030-02-10", "2030-02-20", "2030-04-01"):
+            log = registrar_log(agendamento, medico, "-", "marcada")
+            ConsultaLog.objects.filter(id=log.id).update(
+                criado_em=timezone.make_aware(datetime.datetime.fromisoformat(dia))
+            )
+
+    def test_meses_antigos_arquivados_e_consultados(self, agendamento, logs):
+        antes = consultar_logs(consulta_id=agendamento.id)
+
+        arquivos = arquivar_logs(
+            meses_retencao=1,
+            agora=timezone.make_aware(datetime.datetime(2030, 4, 15)),
+        )
+
+        assert [(a.mes.month, a.registros) for a in arquivos] == [(1, 1), (2, 2)]
+        assert ConsultaLog.objects.count() == 1
+        assert consultar_logs(consulta_id=agendamento.id) == antes
+        assert len(antes) == 4
+
+    def test_consulta_por_periodo_ignora_outros_meses(self, agendamento, logs):
+        arquivar_logs(
+            meses_retencao=1,
+            agora=timezone.make_aware(datetime.datetime(2030, 4, 15)),
+        )
+        inicio, fim = intervalo_mes("2030-02")
+
+        registros = consultar_logs(inicio=inicio, fim=fim)
+
+        assert [r["criado_em"].day for r in registros] == [10, 20]
+        assert consultar_logs(consulta_id=agendamento.id + 1) == []
+
+
+@pytest.mark.django_db
+class TestTimeline:
+
+    @pytest.fixture(autouse=True)
+    def limpar_cache(self):
+        cache.clear()
+        yield
+        cache.clear()
+
+    def url(self, agendamento):
+        return reverse("agendamentos-timeline", args=[agendamento.id])
+
+    def test_timeline_em_cache_ate_a_proxima_transicao(
+        self,
+        api_client,
+        paciente,
+        medico,
+        agendamento,
+        django_capture_on_commit_callbacks,
+    ):
+        registrar_log(agendamento, paciente, "-", AgendamentoConsulta.STATUS_MARCADA)
+        api_client.force_authenticate(user=paciente)
+
+        response = api_client.get(self.url(agendamento))
+
+        assert response.status_code == 200
+        assert [e["status_novo"] for e in response.data] == ["marcada"]
+        assert response.data[0]["usuario"]["id"] == paciente.id
+
+        with CaptureQueriesContext(connection) as contexto:
+            api_client.get(self.url(agendamento))
+
+        assert not [
+            q for q in contexto.captured_queries if "consultas_consultalog" in q["sql"]
+        ]
+
+        with django_capture_on_commit_callbacks(execute=True):
+            cancelar_consulta_service(agendamento, paciente)
+
+        response = api_client.get(self.url(agendamento))
+
+        assert [e["status_novo"] for e in response.data] == ["marcada", "cancelada"]
+
+    def test_timeline_de_outro_paciente(self, api_client, paciente2, agendamento):
+        api_client.force_authenticate(user=paciente2)
+
+        assert api_client.get(self.url(agendamento)).status_code == 404
+
+    def test_timeline_com_cache_local_expira_cedo(self, agendamento):
+        with mock.patch.object(
+            timeline_service, "obter_ou_calcular", return_value=[]
+        ) as obter:
+            timeline_service.timeline_consulta(agendamento.id)
+
+        assert obter.call_args.args[2] == CACHE_TIMEOUT_LOCAL
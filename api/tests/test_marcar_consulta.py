@@ -0,0 +1,295 @@
+import datetime
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+
+from api.constants import API_ERROR_JA_POSSUI_CONSULTA_FUTURA
+from gmp.consultas.constants import (
+    LIMITE_DIARIO_MEDICO,
+    MSG_ERRO_HORARIO_OCUPADO,
+    MSG_ERRO_JA_POSSUI_CONSULTA_FUTURA,
+    MSG_ERRO_LIMITE_DIARIO_MEDICO,
+)
+from gmp.consultas.exceptions import ConsultaStatusInvalidoError
+from gmp.consultas.forms import AgendamentoConsultaForm
+from gmp.consultas.models import (
+    AgendamentoConsulta,
+    ConsultaLog,
+    ContadorDiarioMedico,
+)
+from gmp.consultas.services.consulta_service import (
+    cancelar_consulta_service,
+    marcar_consulta_service,
+)
+from gmp.consultas.services.contador_service import marcadas_no_dia
+from gmp.consultas.services.log_service import transacao_auditada
+from gmp.consultas.services.transicao_service import (
+    transicionar,
+    transicionar_lote,
+    validar_transicao,
+)
+from gmp.usuarios.models import CustomUser
+from gmp.usuarios.services.user_services import UserService
+
+DIA = datetime.date(2030, 1, 1)
+
+
+@pytest.mark.django_db
+class TestValidacaoAgendamento:
+
+    def test_validacao_usa_um_numero_fixo_de_consultas(
+        self, paciente, medico, django_assert_num_queries
+    ):
+        form = AgendamentoConsultaForm(
+            {"medico": medico.id, "data": "2030-01-01", "hora": "10:00"},
+            user=paciente,
+        )
+
+        # Médico selecionado, uma única consulta agregada aos agendamentos
+        # (conflitos de horário), o contador diário do médico e a checagem de
+        # existência das FKs (paciente, médico) feita pelo ModelForm.
+        with django_assert_num_queries(5):
+            assert form.is_valid()
+
+    def test_todas_as_violacoes_sao_retornadas(self, paciente, paciente2, medico):
+        for usuario, data_hora in (
+            (paciente, datetime.datetime(2030, 1, 2, 9, 0)),
+            (paciente2, datetime.datetime(2030, 1, 1, 10, 0)),
+        ):
+            with transacao_auditada():
+                transicionar(
+                    AgendamentoConsulta(
+                        paciente=usuario,
+                        medico=medico,
+                        data_hora=timezone.make_aware(data_hora),
+                    ),
+                    AgendamentoConsulta.STATUS_MARCADA,
+                    usuario,
+                )
+
+        paciente.refresh_from_db()
+
+        form = AgendamentoConsultaForm(
+            {"medico": medico.id, "data": "2030-01-01", "hora": "10:00"},
+            user=paciente,
+        )
+
+        assert not form.is_valid()
+        assert MSG_ERRO_JA_POSSUI_CONSULTA_FUTURA in form.non_field_errors()
+        assert MSG_ERRO_HORARIO_OCUPADO in form.non_field_errors()
+
+
+@pytest.mark.django_db
+class TestContadorDiarioMedico:
+
+    def marcar(self, paciente, medico, hora="10:00"):
+        form = AgendamentoConsultaForm(
+            {"medico": medico.id, "data": "2030-01-01", "hora": hora},
+            user=paciente,
+        )
+        assert form.is_valid()
+        return marcar_consulta_service(form, paciente)
+
+    def test_contador_acompanha_marcacao_e_cancelamento(self, paciente, medico):
+        agendamento = self.marcar(paciente, medico)
+
+        assert marcadas_no_dia(medico.id, DIA) == 1
+
+        cancelar_consulta_service(agendamento, paciente)
+
+        assert marcadas_no_dia(medico.id, DIA) == 0
+
+    def test_limite_diario_usa_contador(self, paciente, medico):
+        ContadorDiarioMedico.objects.create(
+            medico=medico, dia=DIA, marcadas=LIMITE_DIARIO_MEDICO
+        )
+
+        form = AgendamentoConsultaForm(
+            {"medico": medico.id, "data": "2030-01-01", "hora": "10:00"},
+            user=paciente,
+        )
+
+        assert not form.is_valid()
+        assert MSG_ERRO_LIMITE_DIARIO_MEDICO in form.non_field_errors()
+
+    def test_reconciliacao_corrige_contadores(self, client, paciente, medico):
+        AgendamentoConsulta.objects.create(
+            paciente=paciente,
+            medico=medico,
+            data_hora=timezone.make_aware(datetime.datetime(2030, 1, 1, 10, 0)),
+        )
+        ContadorDiarioMedico.objects.create(
+            medico=medico, dia=datetime.date(2030, 1, 2), marcadas=LIMITE_DIARIO_MEDICO
+        )
+
+        call_command("reconciliar_contadores", stdout=StringIO())
+
+        assert marcadas_no_dia(medico.id, DIA) == 1
+        assert marcadas_no_dia(medico.id, datetime.date(2030, 1, 2)) == 0
+
+        client.force_login(paciente)
+        response = client.get(
+            reverse("dias_lotados"),
+            {"medico": medico.id, "inicio": "2030-01-01", "fim": "2030-01-31"},
+        )
+
+        assert response.json() == []
+
+
+@pytest.mark.django_db
+class TestTransicoes:
+
+    def agendamento(self, paciente, medico):
+        return AgendamentoConsulta.objects.create(
+            paciente=paciente,
+            medico=medico,
+            data_hora=timezone.make_aware(datetime.datetime(2030, 1, 1, 10, 0)),
+        )
+
+    def test_transicao_fora_da_tabela(self, paciente, medico):
+        agendamento = self.agendamento(paciente, medico)
+
+        with pytest.raises(ConsultaStatusInvalidoError):
+            validar_transicao(
+                AgendamentoConsulta.STATUS_CANCELADA,
+                AgendamentoConsulta.STATUS_REALIZADA,
+            )
+
+        with transacao_auditada():
+            transicionar(agendamento, AgendamentoConsulta.STATUS_REALIZADA, medico)
+
+        with pytest.raises(ConsultaStatusInvalidoError):
+            cancelar_consulta_service(agendamento, paciente)
+
+    def test_transicao_concorrente_nao_e_aplicada_duas_vezes(self, paciente, medico):
+        agendamento = self.agendamento(paciente, medico)
+        copia = AgendamentoConsulta.objects.get(pk=agendamento.pk)
+
+        cancelar_consulta_service(agendamento, paciente)
+
+        with pytest.raises(ConsultaStatusInvalidoError):
+            with transacao_auditada():
+                transicionar(copia, AgendamentoConsulta.STATUS_REALIZADA, medico)
+
+        assert ConsultaLog.objects.filter(consulta=agendamento).count() == 1
+
+    def test_marcacao_pela_api_usa_o_motor(self, api_client, paciente, medico):
+        api_client.force_authenticate(user=paciente)
+
+        response = api_client.post(
+            reverse("agendamentos-list"),
+            {"medico": medico.id, "data_hora": "2030-01-01T10:00:00-03:00"},
+        )
+
+        assert response.status_code == 201
+        assert ConsultaLog.objects.filter(
+            consulta_id=response.data["id"],
+            status_novo=AgendamentoConsulta.STATUS_MARCADA,
+        ).exists()
+        assert marcadas_no_dia(medico.id, DIA) == 1
+
+
+@pytest.mark.django_db
+class TestProximaConsulta:
+
+    def test_ponteiro_acompanha_marcacao_cancelamento_e_expiracao(
+        self, paciente, medico
+    ):
+        form = AgendamentoConsultaForm(
+            {"medico": medico.id, "data": "2030-01-01", "hora": "10:00"},
+            user=paciente,
+        )
+        assert form.is_valid()
+        agendamento = marcar_consulta_service(form, paciente)
+
+        paciente.refresh_from_db()
+        assert paciente.proxima_consulta_id == agendamento.id
+        assert paciente.proxima_consulta_em == agendamento.data_hora
+        assert paciente.possui_consulta_futura()
+
+        cancelar_consulta_service(agendamento, paciente)
+
+        paciente.refresh_from_db()
+        assert paciente.proxima_consulta_id is None
+        assert not paciente.possui_consulta_futura()
+
+        passado = AgendamentoConsulta.objects.create(
+            paciente=paciente,
+            medico=medico,
+            data_hora=timezone.now() - datetime.timedelta(days=1),
+        )
+
+        with transacao_auditada():
+            transicionar_lote(
+                [(passado.id, medico.id, passado.data_hora)],
+                AgendamentoConsulta.STATUS_MARCADA,
+                AgendamentoConsulta.STATUS_NAO_REALIZADA,
+            )
+
+        paciente.refresh_from_db()
+        assert paciente.proxima_consulta_id is None
+
+    def test_save_do_usuario_nao_sobrescreve_o_ponteiro(
+        self, api_client, paciente, medico
+    ):
+        desatualizado = CustomUser.objects.get(pk=paciente.pk)
+
+        form = AgendamentoConsultaForm(
+            {"medico": medico.id, "data": "2030-01-01", "hora": "10:00"},
+            user=paciente,
+        )
+        assert form.is_valid()
+        agendamento = marcar_consulta_service(form, paciente)
+
+        UserService.update_user(desatualizado, {"nome": "Novo nome"}, desatualizado)
+
+        paciente.refresh_from_db()
+        assert paciente.nome == "Novo nome"
+        assert paciente.proxima_consulta_id == agendamento.id
+
+    def test_api_recusa_segunda_consulta_futura(self, api_client, paciente, medico):
+        api_client.force_authenticate(user=paciente)
+
+        for hora in ("10:00", "11:00"):
+            response = api_client.post(
+                reverse("agendamentos-list"),
+                {"medico": medico.id, "data_hora": f"2030-01-01T{hora}:00-03:00"},
+            )
+            paciente.refresh_from_db()
+
+        assert response.status_code == 400
+        assert response.data["non_field_errors"] == [
+            API_ERROR_JA_POSSUI_CONSULTA_FUTURA
+        ]
+        assert AgendamentoConsulta.objects.filter(paciente=paciente).count() == 1
+
+    def test_validacao_le_a_coluna_do_paciente(self, paciente, medico):
+        # Nenhum agendamento existe: o erro vem apenas do ponteiro carregado.
+        paciente.proxima_consulta_em = timezone.make_aware(
+            datetime.datetime(2030, 1, 2, 9, 0)
+        )
+
+        form = AgendamentoConsultaForm(
+            {"medico": medico.id, "data": "2030-01-01", "hora": "10:00"},
+            user=paciente,
+        )
+
+        assert not form.is_valid()
+        assert MSG_ERRO_JA_POSSUI_CONSULTA_FUTURA in form.non_field_errors()
+
+    def test_minhas_consultas_destaca_a_proxima(self, client, paciente, medico):
+        form = AgendamentoConsultaForm(
+            {"medico": medico.id, "data": "2030-01-01", "hora": "10:00"},
+            user=paciente,
+        )
+        assert form.is_valid()
+        agendamento = marcar_consulta_service(form, paciente)
+
+        client.force_login(paciente)
+        response = client.get(reverse("minhas_consultas"))
+
+        assert response.context["proxima_consulta_id"] == agendamento.id
+        assert "Próxima consulta" in response.content.decode()
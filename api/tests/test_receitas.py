@@ -0,0 +1,351 @@
+import datetime
+import hashlib
+import io
+import threading
+import zipfile
+from unittest import mock
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from django.utils import timezone
+
+from gmp.consultas.forms import ConsultaForm
+from gmp.consultas.models import AgendamentoConsulta, Consulta, ConsultaLog
+from gmp.consultas.services import receita_service, renderizacao_service
+from gmp.consultas.services.consulta_service import registrar_consulta_service
+from gmp.consultas.utils.cache_lru import CacheLRU
+from gmp.consultas.utils.modelo_receita import (
+    caminho_qr,
+    modelo_receita,
+    renderizar_receita,
+)
+
+PARAMETROS = {"crm": "123456-SP", "descricao": "Receita"}
+
+
+@pytest.fixture(autouse=True)
+def limpar_previews():
+    receita_service._previews.clear()
+    yield
+    receita_service._previews.clear()
+
+
+@pytest.fixture
+def agendamento_marcado(paciente, medico):
+    return AgendamentoConsulta.objects.create(
+        paciente=paciente,
+        medico=medico,
+        data_hora=timezone.make_aware(datetime.datetime(2030, 1, 1, 10, 0)),
+    )
+
+
+def url_preview(agendamento):
+    return reverse("gerar_receita_preview", args=[agendamento.id])
+
+
+@pytest.mark.django_db
+class TestReceitaPreview:
+
+    def test_preview_gera_pdf_com_modelo_em_cache(
+        self, client, medico, agendamento_marcado
+    ):
+        client.force_login(medico)
+
+        respostas = [
+            client.get(
+                url_preview(agendamento_marcado),
+                {"crm": "123456-SP", "descricao": f"Receita {indice}"},
+            )
+            for indice in range(2)
+        ]
+
+        assert all(r.status_code == 200 for r in respostas)
+        assert all(r.content.startswith(b"%PDF") for r in respostas)
+        assert modelo_receita.cache_info().currsize == 1
+
+    def test_preview_repetido_vem_do_cache_sem_log(
+        self, client, medico, agendamento_marcado
+    ):
+        client.force_login(medico)
+
+        primeira = client.get(url_preview(agendamento_marcado), PARAMETROS)
+
+        with mock.patch.object(receita_service, "gerar_receita_pdf") as gerar:
+            segunda = client.get(url_preview(agendamento_marcado), PARAMETROS)
+            nao_modificada = client.get(
+                url_preview(agendamento_marcado),
+                PARAMETROS,
+                HTTP_IF_NONE_MATCH=primeira["ETag"],
+            )
+
+        gerar.assert_not_called()
+        assert segunda.content == primeira.content
+        assert segunda["ETag"] == primeira["ETag"]
+        assert nao_modificada.status_code == 304
+        assert ConsultaLog.objects.count() == 1
+
+        alterada = client.get(
+            url_preview(agendamento_marcado), {**PARAMETROS, "descricao": "Outra"}
+        )
+
+        assert alterada["ETag"] != primeira["ETag"]
+        assert ConsultaLog.objects.count() == 2
+
+
+class TestCacheLRU:
+
+    def test_descarta_menos_usados_ao_exceder_limite(self):
+        cache = CacheLRU(limite_bytes=10)
+
+        cache.set("a", b"1234")
+        cache.set("b", b"1234")
+        cache.get("a")
+        cache.set("c", b"1234")
+
+        assert cache.get("b") is None
+        assert cache.get("a") == b"1234"
+        assert cache.total_bytes == 8
+
+
+@pytest.mark.django_db
+class TestRenderizacaoEmProcessos:
+
+    @pytest.fixture(autouse=True)
+    def pool(self, settings):
+        settings.RECEITA_PDF_PROCESSOS = 1
+        yield
+        renderizacao_service.encerrar_processos()
+
+    def test_preview_renderizado_no_pool(self, client, medico, agendamento_marcado):
+        client.force_login(medico)
+
+        response = client.get(url_preview(agendamento_marcado), PARAMETROS)
+
+        assert response.status_code == 200
+        assert response.content.startswith(b"%PDF")
+
+    def test_fila_cheia_responde_503(self, client, medico, agendamento_marcado):
+        client.force_login(medico)
+
+        with mock.patch.object(
+            threading.BoundedSemaphore, "acquire", return_value=False
+        ):
+            response = client.get(url_preview(agendamento_marcado), PARAMETROS)
+
+        assert response.status_code == 503
+        assert ConsultaLog.objects.count() == 0
+
+
+@pytest.mark.django_db
+class TestExportacaoReceitas:
+
+    @pytest.fixture
+    def consultas(self, agendamento_realizado, paciente2, medico):
+        outro = AgendamentoConsulta.objects.create(
+            paciente=paciente2,
+            medico=medico,
+            data_hora=timezone.make_aware(datetime.datetime(2030, 2, 1, 10, 0)),
+            status=AgendamentoConsulta.STATUS_REALIZADA,
+        )
+
+        return [
+            Consulta.objects.create(
+                agendamento=agendamento,
+                condicao_paciente=Consulta.CONDICAO_PACIENTE_ESTAVEL,
+                descricao="Consulta",
+                crm_medico="123456-SP",
+                descricao_receita=f"Receita {agendamento.id}",
+                data_geracao_receita=timezone.now(),
+            )
+            for agendamento in (agendamento_realizado, outro)
+        ]
+
+    def exportar(self, api_client, usuario, **parametros):
+        api_client.force_authenticate(user=usuario)
+        response = api_client.get(reverse("consultas-exportar-receitas"), parametros)
+        assert response.status_code == 200
+        return b"".join(response.streaming_content)
+
+    def test_zip_com_uma_receita_por_consulta(self, api_client, medico, consultas):
+        conteudo = self.exportar(api_client, medico)
+
+        with zipfile.ZipFile(io.BytesIO(conteudo)) as arquivo:
+            nomes = arquivo.namelist()
+            assert all(arquivo.read(nome).startswith(b"%PDF") for nome in nomes)
+
+        assert len(nomes) == 2
+
+    def test_pdf_unico_filtrado_por_mes(self, api_client, medico, consultas):
+        conteudo = self.exportar(api_client, medico, formato="pdf", mes="2030-02")
+
+        assert conteudo.startswith(b"%PDF")
+        assert conteudo.count(b"/Type /Page\n") == 1
+
+    def test_paciente_so_exporta_as_proprias(self, api_client, paciente, consultas):
+        conteudo = self.exportar(api_client, paciente)
+
+        with zipfile.ZipFile(io.BytesIO(conteudo)) as arquivo:
+            assert len(arquivo.namelist()) == 1
+
+    def test_zip_nao_depende_do_pool(self, api_client, medico, consultas, settings):
+        settings.RECEITA_PDF_PROCESSOS = 1
+
+        with mock.patch.object(
+            renderizacao_service,
+            "renderizar_pdf_receita",
+            side_effect=renderizacao_service.RenderizacaoIndisponivelError,
+        ), mock.patch.object(
+            receita_service,
+            "renderizar_pdf_receita",
+            side_effect=renderizacao_service.RenderizacaoIndisponivelError,
+        ):
+            conteudo = self.exportar(api_client, medico)
+
+        with zipfile.ZipFile(io.BytesIO(conteudo)) as arquivo:
+            assert arquivo.testzip() is None
+            assert len(arquivo.namelist()) == 2
+
+
+@pytest.mark.django_db
+class TestReceitaArmazenada:
+
+    @pytest.fixture(autouse=True)
+    def media(self, settings, tmp_path):
+        settings.MEDIA_ROOT = tmp_path
+        return tmp_path
+
+    @pytest.fixture
+    def consulta(self, medico, agendamento_marcado):
+        form = ConsultaForm(
+            {
+                "condicao_paciente": Consulta.CONDICAO_PACIENTE_ESTAVEL,
+                "descricao": "Consulta",
+                "crm_medico": "123456-SP",
+                "descricao_receita": "Receita",
+            }
+        )
+        assert form.is_valid()
+        return registrar_consulta_service(agendamento_marcado, form, medico)
+
+    def url(self, consulta):
+        return reverse("visualizar_receita", args=[consulta.agendamento_id])
+
+    def test_receita_finalizada_gravada_pelo_hash(self, consulta, media):
+        conteudo = consulta.receita_pdf.read()
+
+        assert conteudo.startswith(b"%PDF")
+        assert consulta.receita_pdf.name == (
+            f"receitas/{hashlib.sha256(conteudo).hexdigest()}.pdf"
+        )
+
+        consulta.receita_pdf = None
+        receita_service.armazenar_receita_pdf(consulta)
+
+        assert len(list((media / "receitas").iterdir())) == 1
+
+    def test_download_condicional_e_parcial(self, client, paciente, consulta):
+        client.force_login(paciente)
+        conteudo = consulta.receita_pdf.read()
+        tamanho = len(conteudo)
+
+        response = client.get(self.url(consulta))
+        etag = response["ETag"]
+
+        assert response.status_code == 200
+        assert response["Accept-Ranges"] == "bytes"
+        assert b"".join(response.streaming_content) == conteudo
+
+        response = client.get(self.url(consulta), HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 304
+
+        response = client.get(self.url(consulta), HTTP_RANGE="bytes=0-9")
+        assert response.status_code == 206
+        assert response["Content-Range"] == f"bytes 0-9/{tamanho}"
+        assert b"".join(response.streaming_content) == conteudo[:10]
+
+        response = client.get(self.url(consulta), HTTP_RANGE=f"bytes={tamanho}-")
+        assert response.status_code == 416
+
+    def test_receita_antiga_gravada_no_primeiro_acesso(
+        self, client, paciente, agendamento_realizado
+    ):
+        consulta = Consulta.objects.create(
+            agendamento=agendamento_realizado,
+            condicao_paciente=Consulta.CONDICAO_PACIENTE_ESTAVEL,
+            descricao="Consulta",
+            crm_medico="123456-SP",
+            descricao_receita="Receita",
+            data_geracao_receita=timezone.now(),
+        )
+        client.force_login(paciente)
+
+        assert client.get(self.url(consulta)).status_code == 200
+
+        consulta.refresh_from_db()
+        assert consulta.receita_pdf.name.startswith("receitas/")
+
+    def test_receita_enviada_como_arquivo(
+        self, client, paciente, agendamento_realizado
+    ):
+        conteudo = b"%PDF-1.4 receita enviada"
+        consulta = Consulta.objects.create(
+            agendamento=agendamento_realizado,
+            condicao_paciente=Consulta.CONDICAO_PACIENTE_ESTAVEL,
+            descricao="Consulta",
+            receita=SimpleUploadedFile("receita.pdf", conteudo),
+        )
+        client.force_login(paciente)
+
+        response = client.get(self.url(consulta))
+        etag = response["ETag"]
+
+        assert response.status_code == 200
+        assert response["Content-Type"] == "application/pdf"
+        assert b"".join(response.streaming_content) == conteudo
+
+        response = client.get(self.url(consulta), HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 304
+
+        response = client.get(self.url(consulta), HTTP_RANGE="bytes=0-3")
+        assert response.status_code == 206
+        assert b"".join(response.streaming_content) == b"%PDF"
+
+        consulta.refresh_from_db()
+        assert not consulta.receita_pdf
+
+    def test_consulta_sem_receita(self, client, paciente, agendamento_realizado):
+        consulta = Consulta.objects.create(
+            agendamento=agendamento_realizado,
+            condicao_paciente=Consulta.CONDICAO_PACIENTE_ESTAVEL,
+            descricao="Consulta",
+        )
+        client.force_login(paciente)
+
+        assert client.get(self.url(consulta)).status_code == 404
+
+
+@pytest.mark.django_db
+class TestQrCodeReceita:
+
+    def test_qr_do_protocolo_codificado_uma_vez(self, agendamento_realizado):
+        consulta = Consulta(
+            agendamento=agendamento_realizado,
+            crm_medico="123456-SP",
+            descricao_receita="Receita",
+            data_geracao_receita=timezone.now(),
+        )
+        dados = receita_service.dados_receita_consulta(consulta)
+        caminho_qr.cache_clear()
+
+        renderizar_receita(dados)
+        renderizar_receita(dados)
+
+        assert dados["qr_payload"] == str(consulta.protocolo)
+        assert caminho_qr.cache_info().misses == 1
+        assert caminho_qr.cache_info().hits == 1
+
+    def test_qr_desenhado_como_um_unico_path(self):
+        drawing = modelo_receita()._qr_code("protocolo")
+
+        assert [type(forma).__name__ for forma in drawing.contents] == ["Path"]
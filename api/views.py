@@ -1,14 +1,38 @@
+from django.db.models import ProtectedError
+from django.http import StreamingHttpResponse
 from rest_framework import viewsets
+from rest_framework.decorators import action
 from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.response import Response
 
 from api.constants import (
+    API_ERROR_AGENDAMENTO_COM_HISTORICO,
     API_ERROR_CONSULTA_UPDATE_NOT_ALLOWED,
+    API_ERROR_FORMATO_EXPORTACAO,
+    API_ERROR_LIMITE_EXPORTACAO_PDF,
     API_ERROR_MEDICO_NAO_PODE_MARCAR,
+    API_ERROR_MES_EXPORTACAO,
+    API_ERROR_PACIENTE_EXPORTACAO,
     API_ERROR_SEM_PERMISSAO,
 )
-from gmp.consultas.constants import STATUS_REALIZADA
+from gmp.consultas.constants import EXPORTACAO_RECEITAS_LIMITE_PDF, STATUS_REALIZADA
+from gmp.consultas.exceptions import ConsultaError, RenderizacaoIndisponivelError
 from gmp.consultas.models import AgendamentoConsulta, Consulta
+from gmp.consultas.selectors import receitas_finalizadas
+from gmp.consultas.services.consulta_service import cancelar_consulta_service
+from gmp.consultas.services.exportacao_service import (
+    exportar_receitas_pdf,
+    exportar_receitas_zip,
+)
+from gmp.consultas.services.log_service import transacao_auditada
+from gmp.consultas.services.receita_service import armazenar_receita_pdf
+from gmp.consultas.services.timeline_service import timeline_consulta
+from gmp.consultas.services.transicao_service import (
+    remover_agendamento,
+    reprojetar,
+    transicionar,
+)
 from gmp.usuarios.exceptions import UserDomainException
 from gmp.usuarios.models import CustomUser
 from gmp.usuarios.services.user_services import UserService
@@ -85,7 +109,13 @@ class ConsultaViewSet(viewsets.ModelViewSet):
         )
 
     def perform_create(self, serializer):
-        serializer.save()
+        consulta = serializer.save()
+
+        if consulta.crm_medico and consulta.descricao_receita:
+            try:
+                armazenar_receita_pdf(consulta)
+            except RenderizacaoIndisponivelError:
+                pass
 
     def update(self, request, *args, **kwargs):
         raise ValidationError(API_ERROR_CONSULTA_UPDATE_NOT_ALLOWED)
@@ -93,6 +123,47 @@ class ConsultaViewSet(viewsets.ModelViewSet):
     def partial_update(self, request, *args, **kwargs):
         raise ValidationError(API_ERROR_CONSULTA_UPDATE_NOT_ALLOWED)
 
+    @action(detail=False, methods=["get"], url_path="exportar-receitas")
+    def exportar_receitas(self, request):
+
+        formato = request.query_params.get("formato", "zip")
+
+        if formato not in ("zip", "pdf"):
+            raise ValidationError(API_ERROR_FORMATO_EXPORTACAO)
+
+        paciente_id = request.query_params.get("paciente")
+
+        if paciente_id and not paciente_id.isdigit():
+            raise ValidationError(API_ERROR_PACIENTE_EXPORTACAO)
+
+        try:
+            consultas = receitas_finalizadas(
+                self.get_queryset(),
+                paciente_id=paciente_id,
+                mes=request.query_params.get("mes"),
+            )
+        except ValueError:
+            raise ValidationError(API_ERROR_MES_EXPORTACAO)
+
+        if formato == "pdf":
+            if consultas.count() > EXPORTACAO_RECEITAS_LIMITE_PDF:
+                raise ValidationError(
+                    API_ERROR_LIMITE_EXPORTACAO_PDF.format(
+                        limite=EXPORTACAO_RECEITAS_LIMITE_PDF
+                    )
+                )
+
+            response = StreamingHttpResponse(
+                exportar_receitas_pdf(consultas), content_type="application/pdf"
+            )
+        else:
+            response = StreamingHttpResponse(
+                exportar_receitas_zip(consultas), content_type="application/zip"
+            )
+
+        response["Content-Disposition"] = f'attachment; filename="receitas.{formato}"'
+        return response
+
 
 class AgendamentoConsultaViewSet(viewsets.ModelViewSet):
 
@@ -119,11 +190,49 @@ class AgendamentoConsultaViewSet(viewsets.ModelViewSet):
             raise PermissionDenied(API_ERROR_MEDICO_NAO_PODE_MARCAR)
 
         if user.role == CustomUser.ROLE_PACIENTE:
-            serializer.save(paciente=user)
+            self._marcar(serializer, user, paciente=user)
             return
 
         if user.role == CustomUser.ROLE_SUPERADM:
-            serializer.save()
+            self._marcar(serializer, user)
             return
 
         raise PermissionDenied(API_ERROR_SEM_PERMISSAO)
+
+    @action(detail=True, methods=["get"])
+    def timeline(self, request, pk=None):
+        return Response(timeline_consulta(self.get_object().id))
+
+    def perform_update(self, serializer):
+
+        instance = serializer.instance
+        anterior = (instance.medico_id, instance.data_hora, instance.status)
+
+        with transacao_auditada():
+            reprojetar(serializer.save(), anterior)
+
+    def perform_destroy(self, instance):
+
+        # Um agendamento marcado é cancelado, preservando seu histórico; só
+        # agendamentos sem histórico são removidos de fato.
+        if instance.status == AgendamentoConsulta.STATUS_MARCADA:
+            try:
+                cancelar_consulta_service(instance, self.request.user)
+            except ConsultaError as e:
+                raise ValidationError(str(e))
+            return
+
+        try:
+            with transacao_auditada():
+                remover_agendamento(instance)
+        except ProtectedError:
+            raise ValidationError(API_ERROR_AGENDAMENTO_COM_HISTORICO)
+
+    def _marcar(self, serializer, usuario, **campos):
+
+        agendamento = AgendamentoConsulta(**serializer.validated_data, **campos)
+
+        with transacao_auditada():
+            transicionar(agendamento, AgendamentoConsulta.STATUS_MARCADA, usuario)
+
+        serializer.instance = agendamento
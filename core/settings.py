@@ -95,6 +95,26 @@ MEDIA_URL = "/media/"
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# Cache compartilhado pelos workers e comandos. Sem REDIS_URL, cada processo
+# usa seu próprio LocMemCache: as atualizações e invalidações feitas por um
+# processo não chegam aos demais, então os caches de horários e da timeline
+# passam a expirar em CACHE_TIMEOUT_LOCAL.
+REDIS_URL = os.environ.get("REDIS_URL")
+
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
 from django.contrib.messages import constants
 
 MESSAGE_TAGS = {
@@ -130,3 +150,11 @@ EMAIL_USE_TLS = True
 
 EMAIL_HOST_USER = "gmp@gmp.com"
 EMAIL_HOST_PASSWORD = "SENHA_DE_APP"
+
+# Processos dedicados à renderização de PDFs de receita. Com 0, a
+# renderização acontece no próprio worker da requisição.
+RECEITA_PDF_PROCESSOS = 0
+
+# Grava o ConsultaLog numa thread em segundo plano após o commit, em vez de
+# ao final da transação da requisição.
+CONSULTA_LOG_ASSINCRONO = False
@@ -8,6 +8,8 @@ URL_MINHAS_CONSULTAS = "minhas_consultas"
 URL_HISTORICO_PACIENTE = "historico_paciente"
 URL_CADASTRAR_CONSULTA = "cadastrar_consulta"
 URL_HORARIOS_DISPONIVEIS = "horarios_disponiveis"
+URL_HORARIOS_DISPONIVEIS_PERIODO = "horarios_disponiveis_periodo"
+URL_DIAS_LOTADOS = "dias_lotados"
 URL_CANCELAR_CONSULTA = "cancelar_consulta"
 URL_HISTORICO_MEDICO_CONSULTAS = "historico_medico_consultas"
 URL_MEDICO_PACIENTES = "medico_pacientes"
@@ -25,15 +27,58 @@ HORA_INICIO_ATENDIMENTO = 8
 HORA_FIM_ATENDIMENTO = 21
 FORMATO_HORA = "%H:%M"
 FORMATO_DATA = "%Y-%m-%d"
+FORMATO_MES = "%Y-%m"
 INTERVALO_MINUTOS = (0, 30)
+LIMITE_DIAS_PERIODO_HORARIOS = 31
+LIMITE_MEDICOS_PERIODO_HORARIOS = 20
+PRAZO_REGISTRO_CONSULTA_HORAS = 24
+TAMANHO_LOTE_EXPIRACAO = 500
+HORIZONTE_EXPIRACAO_HORAS = 24
+INTERVALO_SINCRONIZACAO_EXPIRACAO_SEGUNDOS = 30
 
 # =========================
 # LOG / CACHE
 # =========================
 
-CACHE_TIMEOUT_HORARIOS = 60
+CACHE_TIMEOUT_HORARIOS = 60 * 60 * 6
+CACHE_TIMEOUT_LOCAL = 60
+CACHE_TIMEOUT_LOCK = 5
+CACHE_TENTATIVAS_LOCK = 50
+CACHE_ESPERA_LOCK_SEGUNDOS = 0.01
+CACHE_JANELA_STALE_SEGUNDOS = 60 * 10
+CACHE_BETA_RECALCULO = 1.0
+CACHE_PREVIEW_RECEITA_BYTES = 32 * 1024 * 1024
+CACHE_TIMEOUT_TIMELINE = 60 * 60 * 24
+LOG_TAMANHO_LOTE_ASSINCRONO = 500
+LOG_RETENCAO_MESES = 6
+LOG_ARQUIVO_LOTE = 2000
 LOG_STATUS_INICIAL = "-"
 
+# =========================
+# PDF
+# =========================
+
+RECEITA_PDF_TIMEOUT_SEGUNDOS = 15
+RECEITA_PDF_FILA_POR_PROCESSO = 2
+EXPORTACAO_RECEITAS_LOTE = 100
+EXPORTACAO_RECEITAS_LIMITE_PDF = 100
+EXPORTACAO_CHUNK_BYTES = 64 * 1024
+RECEITA_PDF_DIRETORIO = "receitas"
+
+# =========================
+# EMAIL
+# =========================
+
+EMAIL_TAMANHO_LOTE = 100
+EMAIL_MAX_TENTATIVAS = 5
+EMAIL_BACKOFF_BASE_SEGUNDOS = 30
+EMAIL_BACKOFF_MAXIMO_SEGUNDOS = 60 * 60
+EMAIL_RESERVA_SEGUNDOS = 60 * 5
+EMAIL_INTERVALO_WORKER_SEGUNDOS = 5
+EMAIL_CONEXAO_OCIOSA_SEGUNDOS = 60
+LEMBRETE_ANTECEDENCIA_HORAS = 24
+LEMBRETE_TAMANHO_LOTE = 500
+
 # =========================
 # PAGINAÇÃO
 # =========================
@@ -48,6 +93,8 @@ LABEL_CONDICAO_PACIENTE = "Condição do Paciente"
 LABEL_DESCRICAO_CONSULTA = "Descrição da Consulta"
 LABEL_RECEITA = "Receita"
 LABEL_ARQUIVO = "Arquivo"
+LABEL_CRM_MEDICO = "CRM"
+LABEL_DESCRICAO_RECEITA = "Descrição da Receita"
 LABEL_SELECIONE_MEDICO = "Selecione o médico"
 LABEL_DATA_DA_CONSULTA = "Data da Consulta"
 LABEL_HORARIO = "Horário"
@@ -62,6 +109,9 @@ STATUS_REALIZADA = "realizada"
 STATUS_CANCELADA = "cancelada"
 STATUS_NAO_REALIZADA = "nao_realizada"
 STATUS_RECEITA_GERADA = "receita_gerada"
+STATUS_EMAIL_PENDENTE = "pendente"
+STATUS_EMAIL_ENVIADO = "enviado"
+STATUS_EMAIL_FALHOU = "falhou"
 
 # =========================
 # STATUS LABELS
@@ -73,6 +123,9 @@ STATUS_LABEL_REALIZADA = "Realizada"
 STATUS_LABEL_CANCELADA = "Cancelada"
 STATUS_LABEL_NAO_REALIZADA = "Não Realizada"
 STATUS_LABEL_RECEITA_GERADA = "Receita Gerada"
+STATUS_LABEL_EMAIL_PENDENTE = "Pendente"
+STATUS_LABEL_EMAIL_ENVIADO = "Enviado"
+STATUS_LABEL_EMAIL_FALHOU = "Falhou"
 STATUS_LABEL_CONDICAO_PACIENTE_ESTAVEL = "Estável"
 STATUS_LABEL_CONDICAO_PACIENTE_INSTAVEL = "Instável"
 STATUS_LABEL_CONDICAO_PACIENTE_CRITICA = "Crítica"
@@ -42,6 +42,13 @@ MSG_ERRO_CANCELAR_CONSULTA_SERVICE = "Apenas consultas marcadas podem ser cancel
 MSG_ERRO_REGISTRAR_CONSULTA_SERVICE = (
     "Somente consultas marcadas podem ser registradas."
 )
+MSG_ERRO_PERIODO_HORARIOS_INVALIDO = (
+    "Informe médicos e um período válido de até {dias} dias."
+)
+MSG_ERRO_RENDERIZACAO_SOBRECARREGADA = (
+    "A geração de PDFs está sobrecarregada. Tente novamente em instantes."
+)
+MSG_ERRO_RENDERIZACAO_TIMEOUT = "A geração do PDF excedeu o tempo limite."
 
 
 # =========================
@@ -60,3 +67,8 @@ EMAIL_ASSUNTO_CONSULTA_CONFIRMADA = "Consulta confirmada"
 EMAIL_MENSAGEM_CONSULTA_CONFIRMADA = (
     "Sua consulta foi marcada para {data_hora} " "com o médico {medico}."
 )
+EMAIL_ASSUNTO_LEMBRETE_CONSULTA = "Lembrete de consulta"
+EMAIL_MENSAGEM_LEMBRETE_CONSULTA = (
+    "Olá, {paciente}! Lembramos que sua consulta com o médico {medico} "
+    "está marcada para {data_hora}."
+)
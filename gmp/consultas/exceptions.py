@@ -8,6 +8,9 @@ from gmp.consultas.constants.messages_constants import (
     MSG_ERRO_CRM_DESCRICAO_OBRIGATORIOS,
     MSG_ERRO_HORARIO_OCUPADO,
     MSG_ERRO_NAO_PODE_CANCELAR_PASSADA,
+    MSG_ERRO_PERIODO_HORARIOS_INVALIDO,
+    MSG_ERRO_RENDERIZACAO_SOBRECARREGADA,
+    MSG_ERRO_RENDERIZACAO_TIMEOUT,
     MSG_ERRO_SEM_PERMISSAO,
     MSG_ERRO_STATUS_INVALIDO,
 )
@@ -63,3 +66,15 @@ class DadosReceitaInvalidosError(ConsultaError):
 
 class ConsultaNaoEncontradaError(ConsultaError):
     default_message = MSG_ERRO_CONSULTA_NAO_ENCONTRADA
+
+
+class PeriodoHorariosInvalidoError(ConsultaError):
+    default_message = MSG_ERRO_PERIODO_HORARIOS_INVALIDO
+
+
+class RenderizacaoIndisponivelError(ConsultaError):
+    default_message = MSG_ERRO_RENDERIZACAO_SOBRECARREGADA
+
+
+class RenderizacaoTimeoutError(RenderizacaoIndisponivelError):
+    default_message = MSG_ERRO_RENDERIZACAO_TIMEOUT
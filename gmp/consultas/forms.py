@@ -1,24 +1,24 @@
-from datetime import datetime, time, timedelta
+from datetime import timedelta
 
 from django import forms
+from django.db.models import Count, Q
 from django.utils import timezone
 
 from gmp.consultas.constants import (
     ANTECEDENCIA_MINIMA_HORAS,
     DIA_UTIL_FINAL,
-    FORMATO_HORA,
-    HORA_FIM_ATENDIMENTO,
-    HORA_INICIO_ATENDIMENTO,
-    INTERVALO_MINUTOS,
     LABEL_ARQUIVO,
     LABEL_CONDICAO_PACIENTE,
+    LABEL_CRM_MEDICO,
     LABEL_DATA_DA_CONSULTA,
     LABEL_DESCRICAO_CONSULTA,
+    LABEL_DESCRICAO_RECEITA,
     LABEL_HORARIO,
     LABEL_RECEITA,
     LABEL_SELECIONE_MEDICO,
     LIMITE_DIARIO_MEDICO,
     MSG_ERRO_ANTECEDENCIA_MINIMA,
+    MSG_ERRO_CRM_DESCRICAO_OBRIGATORIOS,
     MSG_ERRO_FINAL_DE_SEMANA,
     MSG_ERRO_HORARIO_OCUPADO,
     MSG_ERRO_JA_POSSUI_CONSULTA_FUTURA,
@@ -27,16 +27,15 @@ from gmp.consultas.constants import (
     MSG_ERRO_MEDICO_NAO_PODE_MARCAR,
     MSG_ERRO_PREENCHER_TODOS_CAMPOS,
 )
+from gmp.consultas.services.contador_service import marcadas_no_dia
+from gmp.consultas.utils.grade_horarios import (
+    CHOICES_HORARIOS,
+    instante_do_horario,
+)
 from gmp.usuarios.models import CustomUser
 
 from .models import AgendamentoConsulta, Consulta
 
-HORARIOS_ATENDIMENTO = [
-    time(h, m)
-    for h in range(HORA_INICIO_ATENDIMENTO, HORA_FIM_ATENDIMENTO)
-    for m in INTERVALO_MINUTOS
-]
-
 
 class AgendamentoConsultaForm(forms.ModelForm):
 
@@ -51,10 +50,7 @@ class AgendamentoConsultaForm(forms.ModelForm):
 
     hora = forms.ChoiceField(
         label=LABEL_HORARIO,
-        choices=[
-            (h.strftime(FORMATO_HORA), h.strftime(FORMATO_HORA))
-            for h in HORARIOS_ATENDIMENTO
-        ],
+        choices=CHOICES_HORARIOS,
     )
 
     class Meta:
@@ -97,45 +93,44 @@ class AgendamentoConsultaForm(forms.ModelForm):
         if data.weekday() > DIA_UTIL_FINAL:
             raise forms.ValidationError(MSG_ERRO_FINAL_DE_SEMANA)
 
-        total = AgendamentoConsulta.objects.filter(
-            medico=medico,
-            data_hora__date=data,
-            status=AgendamentoConsulta.STATUS_MARCADA,
-        ).count()
+        data_hora = instante_do_horario(data, hora_str)
+        agora = timezone.now()
 
-        if total >= LIMITE_DIARIO_MEDICO:
-            raise forms.ValidationError(MSG_ERRO_LIMITE_DIARIO_MEDICO)
+        do_medico_no_horario = Q(medico=medico, data_hora=data_hora)
+        do_paciente_no_horario = Q(paciente=paciente, data_hora=data_hora)
 
-        if AgendamentoConsulta.objects.filter(
-            paciente=paciente,
-            data_hora__gt=timezone.now(),
-            status=AgendamentoConsulta.STATUS_MARCADA,
-        ).exists():
-            raise forms.ValidationError(MSG_ERRO_JA_POSSUI_CONSULTA_FUTURA)
+        resumo = (
+            AgendamentoConsulta.objects.filter(
+                status=AgendamentoConsulta.STATUS_MARCADA,
+            )
+            .filter(do_medico_no_horario | do_paciente_no_horario)
+            .aggregate(
+                medico_no_horario=Count("id", filter=do_medico_no_horario),
+                paciente_no_horario=Count("id", filter=do_paciente_no_horario),
+            )
+        )
 
-        hora = datetime.strptime(hora_str, FORMATO_HORA).time()
-        data_hora = data_hora = timezone.make_aware(datetime.combine(data, hora))
+        erros = []
 
-        agora = timezone.now()
-        minimo = agora + timedelta(hours=ANTECEDENCIA_MINIMA_HORAS)
-        if data_hora < minimo:
-            raise forms.ValidationError(
+        if marcadas_no_dia(medico.id, data) >= LIMITE_DIARIO_MEDICO:
+            erros.append(MSG_ERRO_LIMITE_DIARIO_MEDICO)
+
+        if paciente and paciente.possui_consulta_futura(agora):
+            erros.append(MSG_ERRO_JA_POSSUI_CONSULTA_FUTURA)
+
+        if data_hora < agora + timedelta(hours=ANTECEDENCIA_MINIMA_HORAS):
+            erros.append(
                 MSG_ERRO_ANTECEDENCIA_MINIMA.format(horas=ANTECEDENCIA_MINIMA_HORAS)
             )
 
-        if AgendamentoConsulta.objects.filter(
-            medico=medico,
-            data_hora=data_hora,
-            status=AgendamentoConsulta.STATUS_MARCADA,
-        ).exists():
-            raise forms.ValidationError(MSG_ERRO_HORARIO_OCUPADO)
+        if resumo["medico_no_horario"]:
+            erros.append(MSG_ERRO_HORARIO_OCUPADO)
 
-        if AgendamentoConsulta.objects.filter(
-            paciente=paciente,
-            data_hora=data_hora,
-            status=AgendamentoConsulta.STATUS_MARCADA,
-        ).exists():
-            raise forms.ValidationError(MSG_ERRO_JA_POSSUI_CONSULTA_NO_HORARIO)
+        if resumo["paciente_no_horario"]:
+            erros.append(MSG_ERRO_JA_POSSUI_CONSULTA_NO_HORARIO)
+
+        if erros:
+            raise forms.ValidationError(erros)
 
         cleaned["data_hora"] = data_hora
         cleaned["paciente"] = paciente
@@ -157,12 +152,31 @@ class ConsultaForm(forms.ModelForm):
 
     class Meta:
         model = Consulta
-        fields = ["condicao_paciente", "descricao", "receita", "arquivo"]
+        fields = [
+            "condicao_paciente",
+            "descricao",
+            "crm_medico",
+            "descricao_receita",
+            "receita",
+            "arquivo",
+        ]
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
         self.fields["condicao_paciente"].label = LABEL_CONDICAO_PACIENTE
         self.fields["descricao"].label = LABEL_DESCRICAO_CONSULTA
+        self.fields["crm_medico"].label = LABEL_CRM_MEDICO
+        self.fields["descricao_receita"].label = LABEL_DESCRICAO_RECEITA
         self.fields["receita"].label = LABEL_RECEITA
         self.fields["arquivo"].label = LABEL_ARQUIVO
+
+    def clean(self):
+
+        cleaned = super().clean()
+
+        # A receita é opcional, mas só é finalizada com CRM e descrição.
+        if bool(cleaned.get("crm_medico")) != bool(cleaned.get("descricao_receita")):
+            raise forms.ValidationError(MSG_ERRO_CRM_DESCRICAO_OBRIGATORIOS)
+
+        return cleaned
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from gmp.consultas.services.expiracao_service import AgendaExpiracao
+
+
+class Command(BaseCommand):
+    help = (
+        "Mantém em execução a expiração de consultas, finalizando cada "
+        "consulta vencida no instante do seu prazo"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--ciclos",
+            type=int,
+            help="Encerra após o número de ciclos informado (padrão: indefinido).",
+        )
+
+    def handle(self, *args, **kwargs):
+        agenda = AgendaExpiracao()
+
+        total = agenda.carregar()
+        self.stdout.write(
+            f"{total} consultas do backlog atualizadas; {len(agenda)} agendadas."
+        )
+
+        ciclos = kwargs.get("ciclos")
+
+        try:
+            while ciclos is None or ciclos > 0:
+                time.sleep(agenda.segundos_ate_proximo())
+                close_old_connections()
+
+                agenda.sincronizar()
+                total = agenda.expirar_vencidas()
+
+                if total:
+                    self.stdout.write(
+                        self.style.SUCCESS(f"{total} consultas atualizadas.")
+                    )
+
+                if ciclos is not None:
+                    ciclos -= 1
+        except KeyboardInterrupt:
+            self.stdout.write("Encerrado.")
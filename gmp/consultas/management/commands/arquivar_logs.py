@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from gmp.consultas.constants import LOG_RETENCAO_MESES
+from gmp.consultas.services.arquivo_log_service import arquivar_logs
+
+
+class Command(BaseCommand):
+    help = (
+        "Move os registros de ConsultaLog anteriores ao período de retenção "
+        "para arquivos JSONL compactados, um por mês"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--meses",
+            type=int,
+            default=LOG_RETENCAO_MESES,
+            help="Meses mais recentes mantidos na tabela.",
+        )
+
+    def handle(self, *args, **kwargs):
+        arquivos = arquivar_logs(meses_retencao=kwargs["meses"])
+
+        for arquivo in arquivos:
+            self.stdout.write(f"{arquivo.mes:%Y-%m}: {arquivo.registros} registros")
+
+        self.stdout.write(self.style.SUCCESS(f"{len(arquivos)} meses arquivados."))
@@ -6,6 +6,15 @@ from gmp.consultas.models import AgendamentoConsulta
 class Command(BaseCommand):
     help = "Atualiza consultas expiradas"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--lote",
+            type=int,
+            help="Quantidade de consultas atualizadas por transação.",
+        )
+
     def handle(self, *args, **kwargs):
-        total = AgendamentoConsulta.atualizar_consultas_expiradas()
+        total = AgendamentoConsulta.atualizar_consultas_expiradas(
+            tamanho_lote=kwargs.get("lote")
+        )
         self.stdout.write(self.style.SUCCESS(f"{total} consultas atualizadas."))
@@ -0,0 +1,141 @@
+import time
+from io import BytesIO
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from reportlab.graphics.barcode import qr
+from reportlab.graphics.shapes import Drawing
+from reportlab.lib import colors
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.platypus import HRFlowable, Paragraph, SimpleDocTemplate, Spacer
+
+from gmp.consultas.models import AgendamentoConsulta, Consulta
+from gmp.consultas.services.receita_service import dados_receita_consulta
+from gmp.consultas.utils.modelo_receita import renderizar_receita
+
+User = get_user_model()
+
+MEDICO = "Médico Benchmark"
+CRM = "123456-SP"
+DESCRICAO = "Medicamento 10mg\nTomar 1 comprimido ao dia."
+DATA = "2030-01-01 10:00"
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede quantos PDFs de receita por segundo são gerados pela montagem "
+        "anterior (estilos, flowables e QR recriados a cada chamada) e pelo "
+        "modelo em cache, com QR do protocolo da consulta"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--quantidade", type=int, default=200)
+
+    def handle(self, *args, **kwargs):
+        quantidade = kwargs["quantidade"]
+
+        agendamento = AgendamentoConsulta(
+            id=1,
+            paciente=User(nome="Paciente Benchmark", idade=30),
+            medico=User(nome=MEDICO),
+            status=AgendamentoConsulta.STATUS_REALIZADA,
+        )
+
+        consulta = _consulta(agendamento, CRM, DESCRICAO)
+
+        for titulo, gerar in (
+            ("Montagem por chamada (antes)", _gerar_receita_pdf_referencia),
+            ("Modelo em cache, protocolo novo (depois)", _gerar_receita_finalizada),
+            (
+                "Modelo em cache, QR em cache (depois)",
+                lambda *_: renderizar_receita(dados_receita_consulta(consulta)),
+            ),
+        ):
+            gerar(agendamento, MEDICO, CRM, DESCRICAO)
+
+            inicio = time.perf_counter()
+
+            for _ in range(quantidade):
+                gerar(agendamento, MEDICO, CRM, DESCRICAO)
+
+            segundos = time.perf_counter() - inicio
+
+            self.stdout.write(
+                self.style.SUCCESS(f"{titulo}: {quantidade / segundos:.1f} PDFs/s")
+            )
+
+
+def _gerar_receita_finalizada(agendamento, medico_nome, crm, descricao):
+    # Cada receita tem um protocolo novo: o QR é sempre codificado.
+    consulta = _consulta(agendamento, crm, descricao)
+
+    return renderizar_receita(dados_receita_consulta(consulta))
+
+
+def _consulta(agendamento, crm, descricao):
+    return Consulta(
+        agendamento=agendamento,
+        crm_medico=crm,
+        descricao_receita=descricao,
+        data_geracao_receita=timezone.now(),
+    )
+
+
+def _gerar_receita_pdf_referencia(agendamento, medico_nome, crm, descricao):
+    # Cópia da implementação anterior ao modelo em cache, usada como base.
+
+    buffer = BytesIO()
+
+    doc = SimpleDocTemplate(
+        buffer, rightMargin=40, leftMargin=40, topMargin=60, bottomMargin=40
+    )
+
+    styles = getSampleStyleSheet()
+
+    titulo_style = ParagraphStyle(
+        "Titulo",
+        parent=styles["Heading1"],
+        textColor=colors.HexColor("#065f46"),
+        fontSize=18,
+    )
+
+    normal_style = styles["Normal"]
+
+    qr_code = qr.QrCodeWidget(str(agendamento.id))
+    bounds = qr_code.getBounds()
+    size = 100
+    width = bounds[2] - bounds[0]
+    height = bounds[3] - bounds[1]
+
+    drawing = Drawing(size, size, transform=[size / width, 0, 0, size / height, 0, 0])
+    drawing.add(qr_code)
+
+    doc.build(
+        [
+            Paragraph("G.M.P - Receita Médica", titulo_style),
+            Spacer(1, 0.3 * inch),
+            Paragraph(f"Médico: {medico_nome}", normal_style),
+            Paragraph(f"CRM: {crm}", normal_style),
+            Spacer(1, 0.2 * inch),
+            Paragraph(f"Paciente: {agendamento.paciente.nome}", normal_style),
+            Paragraph(f"Idade: {agendamento.paciente.idade}", normal_style),
+            Spacer(1, 0.2 * inch),
+            HRFlowable(width="100%", thickness=1, color=colors.grey),
+            Spacer(1, 0.2 * inch),
+            Paragraph("Descrição da Receita:", styles["Heading3"]),
+            Spacer(1, 0.2 * inch),
+            Paragraph(descricao.replace("\n", "<br/>"), normal_style),
+            Spacer(1, 0.5 * inch),
+            Paragraph(f"Data: {DATA}", normal_style),
+            Spacer(1, 0.5 * inch),
+            Paragraph("Assinatura: ________________________________", normal_style),
+            Spacer(1, 0.5 * inch),
+            drawing,
+        ]
+    )
+
+    buffer.seek(0)
+
+    return buffer
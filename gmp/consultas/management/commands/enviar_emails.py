@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from gmp.consultas.constants import EMAIL_INTERVALO_WORKER_SEGUNDOS, EMAIL_TAMANHO_LOTE
+from gmp.consultas.services.email_service import (
+    fechar_conexao,
+    metricas_email,
+    processar_caixa_saida,
+)
+
+
+class Command(BaseCommand):
+    help = "Envia os e-mails pendentes da caixa de saída"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=EMAIL_TAMANHO_LOTE)
+        parser.add_argument(
+            "--continuo",
+            action="store_true",
+            help="Continua em execução aguardando novos e-mails.",
+        )
+
+    def handle(self, *args, **kwargs):
+        try:
+            while True:
+                enviados, falhas = processar_caixa_saida(kwargs["lote"])
+
+                if enviados or falhas:
+                    self.stdout.write(
+                        self.style.SUCCESS(
+                            f"{enviados} e-mails enviados, {falhas} falhas."
+                        )
+                    )
+
+                if enviados + falhas == kwargs["lote"]:
+                    continue
+
+                if not kwargs["continuo"]:
+                    break
+
+                time.sleep(EMAIL_INTERVALO_WORKER_SEGUNDOS)
+                close_old_connections()
+        except KeyboardInterrupt:
+            self.stdout.write("Encerrado.")
+        finally:
+            fechar_conexao()
+
+        metricas = metricas_email()
+        self.stdout.write(
+            f"{metricas['mensagens_enviadas']} mensagens em "
+            f"{metricas['conexoes_abertas']} conexões "
+            f"({metricas['mensagens_por_segundo']:.1f} mensagens/s)."
+        )
@@ -0,0 +1,37 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from gmp.consultas.constants import LEMBRETE_ANTECEDENCIA_HORAS, LEMBRETE_TAMANHO_LOTE
+from gmp.consultas.services.email_service import fechar_conexao, metricas_email
+from gmp.consultas.services.lembrete_service import enviar_lembretes
+
+
+class Command(BaseCommand):
+    help = "Envia lembretes das consultas marcadas nas próximas horas"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--horas",
+            type=int,
+            default=LEMBRETE_ANTECEDENCIA_HORAS,
+            help="Janela de consultas lembradas, a partir de agora.",
+        )
+        parser.add_argument("--lote", type=int, default=LEMBRETE_TAMANHO_LOTE)
+
+    def handle(self, *args, **kwargs):
+        try:
+            enviados, falhas = enviar_lembretes(
+                antecedencia=timedelta(hours=kwargs["horas"]),
+                tamanho_lote=kwargs["lote"],
+            )
+        finally:
+            fechar_conexao()
+
+        metricas = metricas_email()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{enviados} lembretes enviados, {falhas} falhas "
+                f"({metricas['mensagens_por_segundo']:.1f} mensagens/s)."
+            )
+        )
@@ -0,0 +1,68 @@
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from gmp.consultas.constants import FORMATO_DATA
+from gmp.consultas.models import AgendamentoConsulta
+from gmp.consultas.selectors import filtrar_por_dia
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara o plano de execução e o tempo do filtro por dia com "
+        "`data_hora__date` e com o intervalo [início, fim) usado pelos selectors"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("data", help="Dia filtrado (AAAA-MM-DD).")
+        parser.add_argument("--medico", type=int, help="Filtra também pelo médico.")
+        parser.add_argument(
+            "--database",
+            default="default",
+            help="Alias do banco (ex.: um alias MySQL configurado em DATABASES).",
+        )
+        parser.add_argument("--repeticoes", type=int, default=50)
+
+    def handle(self, *args, **kwargs):
+        data_str = kwargs["data"]
+
+        try:
+            data = datetime.strptime(data_str, FORMATO_DATA).date()
+        except ValueError:
+            raise CommandError(f"Data inválida: {data_str}")
+
+        database = kwargs["database"]
+
+        if database not in connections:
+            raise CommandError(f"Banco não configurado: {database}")
+
+        consultas = AgendamentoConsulta.objects.using(database)
+
+        if kwargs.get("medico"):
+            consultas = consultas.filter(medico_id=kwargs["medico"])
+
+        self.stdout.write(f"Banco: {connections[database].vendor}\n")
+
+        for titulo, queryset in (
+            ("data_hora__date (antes)", consultas.filter(data_hora__date=data)),
+            ("intervalo [início, fim) (depois)", filtrar_por_dia(consultas, data)),
+        ):
+            self._comparar(titulo, queryset, kwargs["repeticoes"])
+
+    def _comparar(self, titulo, queryset, repeticoes):
+
+        inicio = time.perf_counter()
+
+        for _ in range(repeticoes):
+            total = queryset.count()
+
+        media_ms = (time.perf_counter() - inicio) / repeticoes * 1000
+
+        self.stdout.write(self.style.MIGRATE_HEADING(titulo))
+        self.stdout.write(str(queryset.query))
+        self.stdout.write(queryset.explain())
+        self.stdout.write(
+            self.style.SUCCESS(f"{total} consultas, {media_ms:.3f} ms por consulta\n")
+        )
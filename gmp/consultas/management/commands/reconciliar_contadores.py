@@ -0,0 +1,28 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gmp.consultas.constants import FORMATO_DATA
+from gmp.consultas.services.contador_service import reconciliar_contadores
+
+
+class Command(BaseCommand):
+    help = "Recalcula os contadores diários de consultas marcadas por médico"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--desde",
+            help="Primeiro dia reconciliado (AAAA-MM-DD). Padrão: hoje.",
+        )
+
+    def handle(self, *args, **kwargs):
+        desde = kwargs.get("desde")
+
+        if desde:
+            try:
+                desde = datetime.strptime(desde, FORMATO_DATA).date()
+            except ValueError:
+                raise CommandError(f"Data inválida: {desde}")
+
+        total = reconciliar_contadores(desde=desde)
+        self.stdout.write(self.style.SUCCESS(f"{total} contadores corrigidos."))
@@ -0,0 +1,69 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:30
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+import django.db.models.deletion
+
+
+def popular_contadores(apps, schema_editor):
+    AgendamentoConsulta = apps.get_model("consultas", "AgendamentoConsulta")
+    ContadorDiarioMedico = apps.get_model("consultas", "ContadorDiarioMedico")
+
+    totais = (
+        AgendamentoConsulta.objects.filter(status="marcada")
+        .annotate(dia=TruncDate("data_hora", tzinfo=timezone.get_current_timezone()))
+        .values("medico_id", "dia")
+        .annotate(total=Count("id"))
+    )
+
+    ContadorDiarioMedico.objects.bulk_create(
+        ContadorDiarioMedico(
+            medico_id=linha["medico_id"], dia=linha["dia"], marcadas=linha["total"]
+        )
+        for linha in totais
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("consultas", "0013_alter_agendamentoconsulta_status_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ContadorDiarioMedico",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("dia", models.DateField()),
+                ("marcadas", models.PositiveIntegerField(default=0)),
+                (
+                    "medico",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="contadores_diarios",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="contadordiariomedico",
+            constraint=models.UniqueConstraint(
+                fields=("medico", "dia"), name="unique_contador_medico_dia"
+            ),
+        ),
+        migrations.RunPython(popular_contadores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("consultas", "0014_contadordiariomedico"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="agendamentoconsulta",
+            index=models.Index(
+                fields=["atualizado_em"], name="consultas_a_atualiz_baf1c4_idx"
+            ),
+        ),
+    ]
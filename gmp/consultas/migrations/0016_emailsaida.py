@@ -0,0 +1,59 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:36
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("consultas", "0015_agendamentoconsulta_consultas_a_atualiz_baf1c4_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EmailSaida",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("destinatario", models.EmailField(max_length=254)),
+                ("assunto", models.CharField(max_length=255)),
+                ("mensagem", models.TextField()),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pendente", "Pendente"),
+                            ("enviado", "Enviado"),
+                            ("falhou", "Falhou"),
+                        ],
+                        default="pendente",
+                        max_length=10,
+                    ),
+                ),
+                ("tentativas", models.PositiveSmallIntegerField(default=0)),
+                (
+                    "proxima_tentativa_em",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("ultimo_erro", models.TextField(blank=True)),
+                ("criado_em", models.DateTimeField(auto_now_add=True)),
+                ("enviado_em", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["status", "proxima_tentativa_em"],
+                        name="consultas_e_status_2d313d_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("consultas", "0016_emailsaida"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LembreteConsulta",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("enviado_em", models.DateTimeField(auto_now_add=True)),
+                (
+                    "agendamento",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="lembrete",
+                        to="consultas.agendamentoconsulta",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("consultas", "0017_lembreteconsulta"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArquivoConsultaLog",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("mes", models.DateField()),
+                ("arquivo", models.FileField(upload_to="logs/")),
+                ("registros", models.PositiveIntegerField()),
+                ("consulta_min", models.PositiveIntegerField()),
+                ("consulta_max", models.PositiveIntegerField()),
+                ("criado_em", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["mes"], name="consultas_a_mes_c63faf_idx")
+                ],
+            },
+        ),
+    ]
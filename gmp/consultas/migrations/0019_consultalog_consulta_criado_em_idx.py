@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("consultas", "0018_arquivoconsultalog"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="consultalog",
+            index=models.Index(
+                fields=["consulta", "criado_em"], name="consultas_c_consult_9e868e_idx"
+            ),
+        ),
+        migrations.RemoveIndex(
+            model_name="consultalog",
+            name="consultas_c_consult_fe6e17_idx",
+        ),
+    ]
@@ -11,6 +11,9 @@ from gmp.consultas.constants import (
     STATUS_LABEL_CONDICAO_PACIENTE_CRITICA,
     STATUS_LABEL_CONDICAO_PACIENTE_ESTAVEL,
     STATUS_LABEL_CONDICAO_PACIENTE_INSTAVEL,
+    STATUS_LABEL_EMAIL_ENVIADO,
+    STATUS_LABEL_EMAIL_FALHOU,
+    STATUS_LABEL_EMAIL_PENDENTE,
     STATUS_LABEL_INICIAL,
     STATUS_LABEL_MARCADA,
     STATUS_LABEL_NAO_REALIZADA,
@@ -79,6 +82,7 @@ class AgendamentoConsulta(models.Model):
             models.Index(fields=["data_hora"]),
             models.Index(fields=["medico", "data_hora"]),
             models.Index(fields=["paciente", "data_hora"]),
+            models.Index(fields=["atualizado_em"]),
         ]
 
     def __str__(self):
@@ -94,6 +98,15 @@ class AgendamentoConsulta(models.Model):
             raise ConsultaError(MSG_ERRO_AGENDAMENTO_FINALIZADO_DELETE)
         super().delete(*args, **kwargs)
 
+    @classmethod
+    def atualizar_consultas_expiradas(cls, tamanho_lote=None):
+        from gmp.consultas.services.expiracao_service import expirar_consultas
+
+        if tamanho_lote:
+            return expirar_consultas(tamanho_lote=tamanho_lote)
+
+        return expirar_consultas()
+
 
 class Consulta(models.Model):
 
@@ -172,9 +185,108 @@ class ConsultaLog(models.Model):
 
     class Meta:
         indexes = [
-            models.Index(fields=["consulta"]),
+            # Também atende buscas só por consulta (prefixo do índice).
+            models.Index(fields=["consulta", "criado_em"]),
             models.Index(fields=["criado_em"]),
         ]
 
     def __str__(self):
         return f"{self.consulta} - {self.status_anterior} → {self.status_novo}"
+
+
+class ContadorDiarioMedico(models.Model):
+
+    medico = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="contadores_diarios"
+    )
+
+    dia = models.DateField()
+
+    marcadas = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["medico", "dia"], name="unique_contador_medico_dia"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.medico} - {self.dia}: {self.marcadas}"
+
+
+class LembreteConsulta(models.Model):
+
+    agendamento = models.OneToOneField(
+        AgendamentoConsulta, on_delete=models.CASCADE, related_name="lembrete"
+    )
+
+    enviado_em = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.agendamento} - {self.enviado_em}"
+
+
+class EmailSaida(models.Model):
+
+    STATUS_PENDENTE = "pendente"
+    STATUS_ENVIADO = "enviado"
+    STATUS_FALHOU = "falhou"
+
+    STATUS_CHOICES = [
+        (STATUS_PENDENTE, STATUS_LABEL_EMAIL_PENDENTE),
+        (STATUS_ENVIADO, STATUS_LABEL_EMAIL_ENVIADO),
+        (STATUS_FALHOU, STATUS_LABEL_EMAIL_FALHOU),
+    ]
+
+    destinatario = models.EmailField()
+
+    assunto = models.CharField(max_length=255)
+    mensagem = models.TextField()
+
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDENTE
+    )
+
+    tentativas = models.PositiveSmallIntegerField(default=0)
+    proxima_tentativa_em = models.DateTimeField(default=timezone.now)
+    ultimo_erro = models.TextField(blank=True)
+
+    criado_em = models.DateTimeField(auto_now_add=True)
+    enviado_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "proxima_tentativa_em"]),
+        ]
+
+    def __str__(self):
+        return f"{self.destinatario} - {self.assunto} ({self.status})"
+
+
+class ArquivoConsultaLog(models.Model):
+    """
+    Arquivo JSONL compactado com os registros de ConsultaLog de um mês,
+    removidos da tabela pelo comando `arquivar_logs`.
+    """
+
+    mes = models.DateField()
+
+    arquivo = models.FileField(upload_to="logs/")
+
+    registros = models.PositiveIntegerField()
+
+    # Faixa de consultas presentes no arquivo, usada para descartar arquivos
+    # sem abri-los nas consultas ao histórico.
+    consulta_min = models.PositiveIntegerField()
+    consulta_max = models.PositiveIntegerField()
+
+    criado_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["mes"]),
+        ]
+
+    def __str__(self):
+        return f"{self.mes:%Y-%m} - {self.registros} registros"
@@ -1,11 +1,49 @@
+from datetime import datetime, timedelta
+
 from django.contrib.auth import get_user_model
 from django.db.models import QuerySet
 
-from .models import AgendamentoConsulta
+from gmp.consultas.constants import FORMATO_DATA, FORMATO_MES, LIMITE_DIARIO_MEDICO
+from gmp.consultas.utils.grade_horarios import intervalo_do_dia
+
+from .models import AgendamentoConsulta, ContadorDiarioMedico
 
 User = get_user_model()
 
 
+def intervalo_local(data) -> tuple:
+    """
+    Converte uma data local (date ou string em FORMATO_DATA) no intervalo
+    [início, fim) de `data_hora` correspondente no fuso do projeto.
+
+    Filtrar por intervalo, em vez de `data_hora__date`, mantém a coluna livre
+    de funções e permite range scans nos índices de `data_hora`.
+    """
+
+    if isinstance(data, str):
+        data = datetime.strptime(data, FORMATO_DATA).date()
+
+    return intervalo_do_dia(data)
+
+
+def intervalo_mes(mes) -> tuple:
+    """Intervalo [início, fim) local do mês informado como "AAAA-MM"."""
+
+    primeiro_dia = datetime.strptime(mes, FORMATO_MES).date()
+    proximo_mes = (primeiro_dia + timedelta(days=32)).replace(day=1)
+
+    return intervalo_do_dia(primeiro_dia)[0], intervalo_do_dia(proximo_mes)[0]
+
+
+def filtrar_por_dia(consultas, data) -> QuerySet:
+    try:
+        inicio, fim = intervalo_local(data)
+    except ValueError:
+        return consultas.none()
+
+    return consultas.filter(data_hora__gte=inicio, data_hora__lt=fim)
+
+
 def consultas_do_paciente(paciente) -> QuerySet:
     return (
         AgendamentoConsulta.objects.select_related("medico")
@@ -22,13 +60,27 @@ def historico_paciente_realizadas(paciente_id) -> QuerySet:
     )
 
 
-def consultas_realizadas_por_medico(medico) -> QuerySet:
-    return (
-        AgendamentoConsulta.objects.select_related("paciente")
-        .filter(medico_id=medico.id, status=AgendamentoConsulta.STATUS_REALIZADA)
-        .order_by("-data_hora")
+def consultas_realizadas_por_medico(
+    medico,
+    data=None,
+    paciente_id=None,
+    queixa=None,
+) -> QuerySet:
+    consultas = AgendamentoConsulta.objects.select_related("paciente").filter(
+        medico_id=medico.id, status=AgendamentoConsulta.STATUS_REALIZADA
     )
 
+    if data:
+        consultas = filtrar_por_dia(consultas, data)
+
+    if paciente_id:
+        consultas = consultas.filter(paciente_id=paciente_id)
+
+    if queixa:
+        consultas = consultas.filter(paciente__queixa=queixa)
+
+    return consultas.order_by("-data_hora")
+
 
 def agenda_medico_com_filtros(
     medico,
@@ -51,7 +103,7 @@ def agenda_medico_com_filtros(
         consultas = consultas.filter(medico_id=medico.id)
 
     if data:
-        consultas = consultas.filter(data_hora__date=data)
+        consultas = filtrar_por_dia(consultas, data)
 
     if paciente_id:
         consultas = consultas.filter(paciente_id=paciente_id)
@@ -86,3 +138,49 @@ def consulta_marcada_por_id(consulta_id) -> QuerySet:
     return AgendamentoConsulta.objects.select_related("paciente", "medico").filter(
         id=consulta_id, status=AgendamentoConsulta.STATUS_MARCADA
     )
+
+
+def agendamentos_marcados_no_periodo(medico_ids, inicio, fim) -> QuerySet:
+    return AgendamentoConsulta.objects.filter(
+        medico_id__in=medico_ids,
+        data_hora__gte=intervalo_local(inicio)[0],
+        data_hora__lt=intervalo_local(fim)[1],
+        status=AgendamentoConsulta.STATUS_MARCADA,
+    )
+
+
+def dias_lotados_do_medico(medico_id, inicio, fim) -> QuerySet:
+    return (
+        ContadorDiarioMedico.objects.filter(
+            medico_id=medico_id,
+            dia__gte=inicio,
+            dia__lte=fim,
+            marcadas__gte=LIMITE_DIARIO_MEDICO,
+        )
+        .order_by("dia")
+        .values_list("dia", flat=True)
+    )
+
+
+def receitas_finalizadas(consultas, paciente_id=None, mes=None) -> QuerySet:
+    """
+    Consultas (já restritas ao usuário) com receita finalizada, opcionalmente
+    de um paciente e/ou do mês da consulta ("AAAA-MM").
+    """
+
+    consultas = consultas.filter(
+        crm_medico__gt="", descricao_receita__gt="", data_geracao_receita__isnull=False
+    )
+
+    if paciente_id:
+        consultas = consultas.filter(agendamento__paciente_id=paciente_id)
+
+    if mes:
+        inicio, fim = intervalo_mes(mes)
+        consultas = consultas.filter(
+            agendamento__data_hora__gte=inicio, agendamento__data_hora__lt=fim
+        )
+
+    return consultas.select_related(
+        "agendamento__paciente", "agendamento__medico"
+    ).order_by("agendamento__data_hora", "id")
@@ -0,0 +1,179 @@
+import gzip
+import io
+import json
+import tempfile
+from datetime import datetime
+
+from django.core.files import File
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from gmp.consultas.constants import (
+    FORMATO_MES,
+    LOG_ARQUIVO_LOTE,
+    LOG_RETENCAO_MESES,
+)
+from gmp.consultas.models import ArquivoConsultaLog, ConsultaLog
+from gmp.consultas.selectors import intervalo_mes
+
+# A tabela ConsultaLog guarda apenas os meses recentes. Os meses anteriores a
+# LOG_RETENCAO_MESES são movidos, um a um, para arquivos JSONL compactados
+# (uma linha por registro, com os campos de CAMPOS_LOG) registrados em
+# ArquivoConsultaLog; o arquivo é gravado antes e os registros só são
+# removidos na mesma transação que cria o ArquivoConsultaLog.
+# `consultar_logs` devolve o histórico das duas origens no mesmo formato.
+
+CAMPOS_LOG = (
+    "id",
+    "consulta_id",
+    "usuario_id",
+    "status_anterior",
+    "status_novo",
+    "criado_em",
+)
+
+
+def arquivar_logs(meses_retencao=LOG_RETENCAO_MESES, agora=None):
+    """
+    Arquiva os meses anteriores aos `meses_retencao` mais recentes e retorna
+    a lista de ArquivoConsultaLog criados.
+    """
+
+    limite = _inicio_do_mes(timezone.localdate(agora), -meses_retencao)
+    arquivos = []
+
+    while True:
+        mais_antigo = (
+            ConsultaLog.objects.filter(criado_em__lt=limite)
+            .order_by("criado_em")
+            .values_list("criado_em", flat=True)
+            .first()
+        )
+
+        if mais_antigo is None:
+            return arquivos
+
+        mes = _inicio_do_mes(timezone.localdate(mais_antigo))
+        arquivos.append(_arquivar_mes(mes))
+
+
+def consultar_logs(consulta_id=None, inicio=None, fim=None):
+    """
+    Registros de log (dicionários com CAMPOS_LOG) da tabela e dos arquivos,
+    opcionalmente de uma consulta e do intervalo [inicio, fim), ordenados por
+    criação.
+    """
+
+    logs = ConsultaLog.objects.order_by()
+
+    if consulta_id is not None:
+        logs = logs.filter(consulta_id=consulta_id)
+
+    if inicio is not None:
+        logs = logs.filter(criado_em__gte=inicio)
+
+    if fim is not None:
+        logs = logs.filter(criado_em__lt=fim)
+
+    registros = list(logs.values(*CAMPOS_LOG))
+    registros.extend(logs_arquivados(consulta_id, inicio, fim))
+    registros.sort(key=lambda registro: (registro["criado_em"], registro["id"]))
+
+    return registros
+
+
+def logs_arquivados(consulta_id=None, inicio=None, fim=None):
+    """Registros de log vindos apenas dos arquivos, com os filtros de `consultar_logs`."""
+
+    arquivos = ArquivoConsultaLog.objects.order_by("mes", "id")
+
+    if consulta_id is not None:
+        arquivos = arquivos.filter(
+            consulta_min__lte=consulta_id, consulta_max__gte=consulta_id
+        )
+
+    if inicio is not None:
+        arquivos = arquivos.filter(
+            mes__gte=_inicio_do_mes(timezone.localdate(inicio)).date()
+        )
+
+    if fim is not None:
+        arquivos = arquivos.filter(mes__lt=timezone.localdate(fim))
+
+    return [
+        registro
+        for arquivo in arquivos
+        for registro in _ler_arquivo(arquivo)
+        if (consulta_id is None or registro["consulta_id"] == consulta_id)
+        and (inicio is None or registro["criado_em"] >= inicio)
+        and (fim is None or registro["criado_em"] < fim)
+    ]
+
+
+def _arquivar_mes(mes):
+
+    inicio, fim = intervalo_mes(mes.strftime(FORMATO_MES))
+    logs = ConsultaLog.objects.filter(criado_em__gte=inicio, criado_em__lt=fim)
+
+    # Fixa o último id para que registros gravados durante o arquivamento
+    # (não deveriam existir num mês passado) não sejam removidos sem cópia.
+    faixa = logs.aggregate(
+        ultimo_id=Max("id"),
+        consulta_min=Min("consulta_id"),
+        consulta_max=Max("consulta_id"),
+    )
+    logs = logs.filter(id__lte=faixa["ultimo_id"])
+
+    with tempfile.TemporaryFile() as temporario:
+        registros = 0
+
+        with gzip.GzipFile(fileobj=temporario, mode="wb") as compactado:
+            for registro in (
+                logs.order_by("id")
+                .values(*CAMPOS_LOG)
+                .iterator(chunk_size=LOG_ARQUIVO_LOTE)
+            ):
+                registro["criado_em"] = registro["criado_em"].isoformat()
+                linha = json.dumps(registro)
+                compactado.write(linha.encode() + b"\n")
+                registros += 1
+
+        temporario.seek(0)
+
+        with transaction.atomic():
+            arquivo = ArquivoConsultaLog(
+                mes=mes.date(),
+                registros=registros,
+                consulta_min=faixa["consulta_min"],
+                consulta_max=faixa["consulta_max"],
+            )
+            arquivo.arquivo.save(
+                f"consultalog_{mes:%Y-%m}.jsonl.gz",
+                File(temporario),
+                save=False,
+            )
+            arquivo.save()
+
+            logs.delete()
+
+    return arquivo
+
+
+def _ler_arquivo(arquivo):
+
+    with arquivo.arquivo.open("rb") as bruto:
+        with gzip.GzipFile(fileobj=bruto) as compactado:
+            for linha in io.TextIOWrapper(compactado, encoding="utf-8"):
+                registro = json.loads(linha)
+                registro["criado_em"] = datetime.fromisoformat(registro["criado_em"])
+                yield registro
+
+
+def _inicio_do_mes(data, deslocamento=0):
+    """Início local (aware) do mês de `data` deslocado em `deslocamento` meses."""
+
+    indice = data.year * 12 + data.month - 1 + deslocamento
+    mes = f"{indice // 12:04d}-{indice % 12 + 1:02d}"
+
+    return timezone.localtime(intervalo_mes(mes)[0])
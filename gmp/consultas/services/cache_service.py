@@ -1,4 +1,34 @@
-from django.core.cache import cache
+import math
+import random
+import time
+import uuid
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.utils import timezone
+
+from gmp.consultas.constants import (
+    CACHE_BETA_RECALCULO,
+    CACHE_ESPERA_LOCK_SEGUNDOS,
+    CACHE_JANELA_STALE_SEGUNDOS,
+    CACHE_TENTATIVAS_LOCK,
+    CACHE_TIMEOUT_HORARIOS,
+    CACHE_TIMEOUT_LOCAL,
+    CACHE_TIMEOUT_LOCK,
+    FORMATO_DATA,
+    STATUS_MARCADA,
+)
+from gmp.consultas.utils.cache_keys import (
+    consulta_namespace,
+    dia_namespace,
+    lock_key,
+    namespace_key,
+    ocupacao_medico_key,
+    recalculo_key,
+    revisao_key,
+)
+from gmp.consultas.utils.grade_horarios import bit_do_horario
 
 
 def get_cache(key):
@@ -9,5 +39,354 @@ def set_cache(key, value, timeout=None):
     cache.set(key, value, timeout=timeout)
 
 
+def get_many_cache(keys):
+    return cache.get_many(keys)
+
+
+def set_many_cache(data, timeout=None):
+    cache.set_many(data, timeout=timeout)
+
+
 def delete_cache(key):
     cache.delete(key)
+
+
+def timeout_compartilhado(timeout):
+    """
+    TTL de uma entrada que outros processos atualizam ou invalidam. Com um
+    cache local ao processo (LocMemCache), essas atualizações não chegam aos
+    demais workers, então a entrada vive no máximo CACHE_TIMEOUT_LOCAL.
+    """
+
+    if isinstance(caches["default"], LocMemCache):
+        return min(timeout, CACHE_TIMEOUT_LOCAL)
+
+    return timeout
+
+
+# =========================
+# NAMESPACES
+# =========================
+
+# Cada namespace (dia, consulta) tem um contador de geração. As chaves
+# versionadas embutem a geração atual de seus namespaces, então incrementar o
+# contador invalida todas as entradas do namespace sem varrer chaves: as
+# antigas deixam de ser lidas e expiram sozinhas.
+
+
+def versoes_namespaces(namespaces):
+
+    chaves = {namespace: namespace_key(namespace) for namespace in set(namespaces)}
+    em_cache = cache.get_many(list(chaves.values()))
+
+    versoes = {}
+
+    for namespace, chave in chaves.items():
+        versao = em_cache.get(chave)
+
+        if versao is None:
+            versao = _nova_versao()
+
+            if not cache.add(chave, versao, None):
+                versao = cache.get(chave, versao)
+
+        versoes[namespace] = versao
+
+    return versoes
+
+
+def chave_versionada(key, namespaces, versoes=None):
+
+    if versoes is None:
+        versoes = versoes_namespaces(namespaces)
+
+    geracoes = ":".join(f"{namespace}.{versoes[namespace]}" for namespace in namespaces)
+
+    return f"{key}:{geracoes}"
+
+
+def invalidar_namespace(namespace):
+
+    chave = namespace_key(namespace)
+
+    try:
+        cache.incr(chave)
+    except ValueError:
+        cache.set(chave, _nova_versao(), None)
+
+
+def invalidar_namespaces_apos_commit(namespaces):
+
+    namespaces = set(namespaces)
+
+    def invalidar():
+        for namespace in namespaces:
+            invalidar_namespace(namespace)
+
+    transaction.on_commit(invalidar)
+
+
+def _nova_versao():
+    # Baseada no relógio para que um contador despejado do cache nunca
+    # volte a uma geração já utilizada.
+    return time.time_ns()
+
+
+# =========================
+# RECÁLCULO (SINGLE-FLIGHT)
+# =========================
+
+# Valores recalculáveis são gravados em envelopes (valor, expira_em, custo).
+# `expira_em` é a expiração lógica; a entrada física sobrevive por mais
+# CACHE_JANELA_STALE_SEGUNDOS para que, enquanto um único worker recalcula
+# (protegido por lock), os demais continuem servindo o valor anterior. Perto
+# da expiração, cada leitura decide com probabilidade crescente (proporcional
+# ao custo do último recálculo) antecipar a atualização, o que espalha os
+# recálculos em vez de concentrá-los no instante em que a entrada expira.
+
+
+def obter_ou_calcular(key, calcular, timeout):
+    return obter_many_ou_calcular({key: key}, lambda itens: {key: calcular()}, timeout)[
+        key
+    ]
+
+
+def obter_many_ou_calcular(chaves, calcular, timeout):
+    """
+    Retorna {item: valor} para `chaves` ({item: chave de cache}).
+
+    `calcular` recebe a lista de itens que este worker deve recalcular e
+    devolve {item: valor}. Um valor recalculado só é gravado se nenhuma
+    escrita concorrente (ver `atualizar_envelope`) alterou a chave durante o
+    cálculo.
+    """
+
+    em_cache = cache.get_many(
+        [*chaves.values(), *(revisao_key(chave) for chave in chaves.values())]
+    )
+
+    valores = {}
+    recalcular = []
+
+    for item, chave in chaves.items():
+        envelope = em_cache.get(chave)
+
+        if envelope is not None:
+            valores[item] = envelope[0]
+
+            if not _expiracao_antecipada(envelope):
+                continue
+
+        if cache.add(recalculo_key(chave), True, CACHE_TIMEOUT_LOCK):
+            recalcular.append(item)
+
+    if recalcular:
+        try:
+            inicio = time.monotonic()
+            calculados = calcular(recalcular)
+            custo = time.monotonic() - inicio
+
+            revisoes = cache.get_many(
+                [revisao_key(chaves[item]) for item in recalcular]
+            )
+
+            cache.set_many(
+                {
+                    chaves[item]: (calculados[item], time.time() + timeout, custo)
+                    for item in recalcular
+                    if revisoes.get(revisao_key(chaves[item]))
+                    == em_cache.get(revisao_key(chaves[item]))
+                },
+                timeout=timeout + CACHE_JANELA_STALE_SEGUNDOS,
+            )
+
+            valores.update(calculados)
+        finally:
+            cache.delete_many([recalculo_key(chaves[item]) for item in recalcular])
+
+    aguardando = {item: chave for item, chave in chaves.items() if item not in valores}
+
+    if aguardando:
+        valores.update(_aguardar_recalculo(aguardando, calcular))
+
+    return valores
+
+
+def atualizar_envelope(key, funcao, timeout):
+    """
+    Aplica `funcao` ao valor em cache de um envelope, se existir, preservando
+    sua expiração lógica. Leituras do banco em andamento para a mesma chave
+    deixam de ser gravadas.
+    """
+
+    cache.set(revisao_key(key), uuid.uuid4().hex, timeout + CACHE_JANELA_STALE_SEGUNDOS)
+
+    if not _adquirir_lock(key):
+        cache.delete(key)
+        return
+
+    try:
+        envelope = cache.get(key)
+
+        if envelope is not None:
+            valor, expira_em, custo = envelope
+            cache.set(
+                key,
+                (funcao(valor), expira_em, custo),
+                timeout + CACHE_JANELA_STALE_SEGUNDOS,
+            )
+    finally:
+        cache.delete(lock_key(key))
+
+
+def _expiracao_antecipada(envelope):
+    _, expira_em, custo = envelope
+
+    return (
+        time.time() - custo * CACHE_BETA_RECALCULO * math.log(1 - random.random())
+        >= expira_em
+    )
+
+
+def _aguardar_recalculo(chaves, calcular):
+
+    pendentes = dict(chaves)
+    valores = {}
+
+    for _ in range(CACHE_TENTATIVAS_LOCK):
+        time.sleep(CACHE_ESPERA_LOCK_SEGUNDOS)
+
+        em_cache = cache.get_many(list(pendentes.values()))
+
+        for item, chave in list(pendentes.items()):
+            if chave in em_cache:
+                valores[item] = em_cache[chave][0]
+                del pendentes[item]
+
+        if not pendentes:
+            return valores
+
+    # Quem recalculava desistiu ou não pôde gravar: calcula sem gravar.
+    valores.update(calcular(list(pendentes)))
+
+    return valores
+
+
+# =========================
+# DISPONIBILIDADE
+# =========================
+
+# A ocupação de cada médico/dia fica em cache como máscara de bits (ver
+# utils.grade_horarios). Leituras reconstroem a máscara a partir do banco
+# apenas quando necessário (com proteção contra stampede); escritas aplicam o
+# bit após o commit, de modo que o cache reflete exatamente o que foi
+# persistido.
+
+
+def obter_ocupacoes(pares, carregar):
+    """
+    Retorna {(medico_id, data): mascara} para os pares informados.
+
+    `carregar` recebe os pares que precisam ser lidos do banco e devolve suas
+    máscaras.
+    """
+
+    return obter_many_ou_calcular(
+        _chaves_ocupacao(pares), carregar, timeout_compartilhado(CACHE_TIMEOUT_HORARIOS)
+    )
+
+
+def atualizar_ocupacao(medico_id, data_hora, ocupado):
+    transaction.on_commit(lambda: _aplicar_ocupacao(medico_id, data_hora, ocupado))
+
+
+def sincronizar_ocupacao(agendamento, anterior=None):
+    """
+    Reflete no cache a transição de um agendamento.
+
+    `anterior` é a tupla (medico_id, data_hora, status) antes da alteração,
+    quando o horário ou o médico do agendamento podem ter mudado.
+    """
+
+    if anterior:
+        medico_id, data_hora, status = anterior
+
+        if status == STATUS_MARCADA:
+            atualizar_ocupacao(medico_id, data_hora, ocupado=False)
+
+    atualizar_ocupacao(
+        agendamento.medico_id,
+        agendamento.data_hora,
+        ocupado=agendamento.status == STATUS_MARCADA,
+    )
+
+
+def invalidar_ocupacoes_dos_dias(dias):
+    """Descarta, após o commit, as ocupações em cache dos dias informados."""
+
+    invalidar_namespaces_apos_commit(
+        dia_namespace(dia.strftime(FORMATO_DATA)) for dia in dias
+    )
+
+
+def _aplicar_ocupacao(medico_id, data_hora, ocupado):
+
+    bit = bit_do_horario(data_hora)
+
+    if not bit:
+        return
+
+    par = (medico_id, timezone.localtime(data_hora).date())
+    chave = _chaves_ocupacao([par])[par]
+
+    atualizar_envelope(
+        chave,
+        lambda mascara: mascara | bit if ocupado else mascara & ~bit,
+        timeout_compartilhado(CACHE_TIMEOUT_HORARIOS),
+    )
+
+
+def _chaves_ocupacao(pares):
+
+    # Só o dia entra na chave: a máscara depende apenas dos agendamentos, e
+    # nada no cadastro do médico (perfil, ativação) a altera.
+    namespaces = {
+        (medico_id, data): (dia_namespace(data.strftime(FORMATO_DATA)),)
+        for medico_id, data in pares
+    }
+
+    versoes = versoes_namespaces(
+        [namespace for par in namespaces.values() for namespace in par]
+    )
+
+    return {
+        (medico_id, data): chave_versionada(
+            ocupacao_medico_key(medico_id, data.strftime(FORMATO_DATA)),
+            namespaces[(medico_id, data)],
+            versoes,
+        )
+        for medico_id, data in pares
+    }
+
+
+def _adquirir_lock(chave):
+
+    for _ in range(CACHE_TENTATIVAS_LOCK):
+        if cache.add(lock_key(chave), True, CACHE_TIMEOUT_LOCK):
+            return True
+        time.sleep(CACHE_ESPERA_LOCK_SEGUNDOS)
+
+    return False
+
+
+# =========================
+# TIMELINE
+# =========================
+
+
+def invalidar_timelines(consulta_ids):
+    """Descarta, após o commit, as timelines em cache das consultas informadas."""
+
+    invalidar_namespaces_apos_commit(
+        consulta_namespace(consulta_id) for consulta_id in consulta_ids
+    )
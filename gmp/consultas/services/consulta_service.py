@@ -1,15 +1,12 @@
-from django.conf import settings
-from django.core.cache import cache
-from django.core.mail import send_mail
-from django.db import transaction
 from django.utils import timezone
 
 from gmp.consultas.constants.constants import (
     FORMATO_DATA,
     FORMATO_HORA,
-    LOG_STATUS_INICIAL,
 )
 from gmp.consultas.constants.messages_constants import (
+    EMAIL_ASSUNTO_CONSULTA_CONFIRMADA,
+    EMAIL_MENSAGEM_CONSULTA_CONFIRMADA,
     MSG_ERRO_CANCELAR_CONSULTA_SERVICE,
     MSG_ERRO_REGISTRAR_CONSULTA_SERVICE,
 )
@@ -17,17 +14,21 @@ from gmp.consultas.exceptions import (
     ConsultaError,
     ConsultaPassadaError,
     ConsultaPermissaoNegadaError,
-    ConsultaStatusInvalidoError,
+    RenderizacaoIndisponivelError,
+)
+from gmp.consultas.models import AgendamentoConsulta
+from gmp.consultas.services.email_service import enfileirar_email
+from gmp.consultas.services.log_service import transacao_auditada
+from gmp.consultas.services.receita_service import armazenar_receita_pdf
+from gmp.consultas.services.transicao_service import (
+    transicionar,
+    validar_transicao,
 )
-from gmp.consultas.models import AgendamentoConsulta, ConsultaLog
-from gmp.consultas.services.cache_service import delete_cache
-from gmp.consultas.services.log_service import registrar_log
-from gmp.consultas.utils.cache_keys import horarios_medico_key
 
 
 def marcar_consulta_service(form, usuario):
 
-    with transaction.atomic():
+    with transacao_auditada():
 
         agendamento = form.save(commit=False)
 
@@ -37,27 +38,17 @@ def marcar_consulta_service(form, usuario):
         if usuario.role == usuario.ROLE_SUPERADM and not agendamento.paciente:
             raise ConsultaError("Selecione um paciente.")
 
-        agendamento.save()
-
-        ConsultaLog.objects.create(
-            consulta=agendamento,
-            usuario=usuario,
-            status_anterior=LOG_STATUS_INICIAL,
-            status_novo=AgendamentoConsulta.STATUS_MARCADA,
-        )
+        transicionar(agendamento, AgendamentoConsulta.STATUS_MARCADA, usuario)
 
-        transaction.on_commit(
-            lambda: send_mail(
-                subject="Consulta confirmada",
-                message=(
-                    f"Sua consulta foi marcada para "
-                    f"{agendamento.data_hora.strftime(FORMATO_DATA + ' às ' + FORMATO_HORA)} "
-                    f"com o médico {agendamento.medico.nome}."
+        enfileirar_email(
+            destinatario=agendamento.paciente.email,
+            assunto=EMAIL_ASSUNTO_CONSULTA_CONFIRMADA,
+            mensagem=EMAIL_MENSAGEM_CONSULTA_CONFIRMADA.format(
+                data_hora=timezone.localtime(agendamento.data_hora).strftime(
+                    FORMATO_DATA + " às " + FORMATO_HORA
                 ),
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[agendamento.paciente.email],
-                fail_silently=True,
-            )
+                medico=agendamento.medico.nome,
+            ),
         )
 
     return agendamento
@@ -65,8 +56,11 @@ def marcar_consulta_service(form, usuario):
 
 def cancelar_consulta_service(consulta, usuario):
 
-    if consulta.status != AgendamentoConsulta.STATUS_MARCADA:
-        raise ConsultaStatusInvalidoError(MSG_ERRO_CANCELAR_CONSULTA_SERVICE)
+    validar_transicao(
+        consulta.status,
+        AgendamentoConsulta.STATUS_CANCELADA,
+        MSG_ERRO_CANCELAR_CONSULTA_SERVICE,
+    )
 
     if consulta.data_hora <= timezone.now():
         raise ConsultaPassadaError()
@@ -77,53 +71,52 @@ def cancelar_consulta_service(consulta, usuario):
     if usuario.role == usuario.ROLE_PACIENTE and consulta.paciente != usuario:
         raise ConsultaPermissaoNegadaError()
 
-    with transaction.atomic():
-
-        status_anterior = consulta.status
-
-        consulta.status = AgendamentoConsulta.STATUS_CANCELADA
-        consulta.cancelado_por = usuario
-        consulta.save(update_fields=["status", "cancelado_por", "cancelado_em"])
-
-        data_str = consulta.data_hora.date().strftime(FORMATO_DATA)
-        cache.delete(horarios_medico_key(consulta.medico.id, data_str))
-
-    registrar_log(
-        consulta=consulta,
-        usuario=usuario,
-        status_anterior=status_anterior,
-        status_novo=AgendamentoConsulta.STATUS_CANCELADA,
-    )
+    with transacao_auditada():
+        transicionar(
+            consulta,
+            AgendamentoConsulta.STATUS_CANCELADA,
+            usuario,
+            mensagem_erro=MSG_ERRO_CANCELAR_CONSULTA_SERVICE,
+            cancelado_por=usuario,
+        )
 
     return consulta
 
 
 def registrar_consulta_service(agendamento, form, usuario):
 
-    if agendamento.status != AgendamentoConsulta.STATUS_MARCADA:
-        raise ConsultaStatusInvalidoError(MSG_ERRO_REGISTRAR_CONSULTA_SERVICE)
+    validar_transicao(
+        agendamento.status,
+        AgendamentoConsulta.STATUS_REALIZADA,
+        MSG_ERRO_REGISTRAR_CONSULTA_SERVICE,
+    )
 
     if agendamento.medico != usuario:
         raise ConsultaPermissaoNegadaError()
 
-    with transaction.atomic():
+    with transacao_auditada():
 
         consulta = form.save(commit=False)
         consulta.agendamento = agendamento
-        consulta.save()
 
-        status_anterior = agendamento.status
-        agendamento.status = AgendamentoConsulta.STATUS_REALIZADA
-        agendamento.save(update_fields=["status"])
+        if consulta.crm_medico and consulta.descricao_receita:
+            consulta.data_geracao_receita = timezone.now()
 
-        data_str = agendamento.data_hora.date().strftime(FORMATO_DATA)
-        delete_cache(horarios_medico_key(agendamento.medico.id, data_str))
+        consulta.save()
 
-        ConsultaLog.objects.create(
-            consulta=agendamento,
-            usuario=usuario,
-            status_anterior=status_anterior,
-            status_novo=AgendamentoConsulta.STATUS_REALIZADA,
+        transicionar(
+            agendamento,
+            AgendamentoConsulta.STATUS_REALIZADA,
+            usuario,
+            mensagem_erro=MSG_ERRO_REGISTRAR_CONSULTA_SERVICE,
         )
 
+    # A receita é renderizada fora da transação. Se a renderização estiver
+    # indisponível, ela é gravada no primeiro download (`receita_pdf_service`).
+    if consulta.data_geracao_receita:
+        try:
+            armazenar_receita_pdf(consulta)
+        except RenderizacaoIndisponivelError:
+            pass
+
     return consulta
@@ -0,0 +1,124 @@
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from gmp.consultas.constants import STATUS_MARCADA
+from gmp.consultas.models import AgendamentoConsulta, ContadorDiarioMedico
+
+
+def ajustar_contador(medico_id, data_hora, delta):
+
+    dia = timezone.localdate(data_hora)
+
+    if delta < 0:
+        ContadorDiarioMedico.objects.filter(
+            medico_id=medico_id, dia=dia, marcadas__gte=-delta
+        ).update(marcadas=F("marcadas") + delta)
+        return
+
+    atualizados = ContadorDiarioMedico.objects.filter(
+        medico_id=medico_id, dia=dia
+    ).update(marcadas=F("marcadas") + delta)
+
+    if atualizados:
+        return
+
+    try:
+        with transaction.atomic():
+            ContadorDiarioMedico.objects.create(
+                medico_id=medico_id, dia=dia, marcadas=delta
+            )
+    except IntegrityError:
+        ContadorDiarioMedico.objects.filter(medico_id=medico_id, dia=dia).update(
+            marcadas=F("marcadas") + delta
+        )
+
+
+def sincronizar_contador(agendamento, anterior=None):
+    """
+    Reflete nos contadores diários a transição de um agendamento.
+
+    `anterior` é a tupla (medico_id, data_hora, status) antes da alteração;
+    sem ela, o agendamento é tratado como recém-criado.
+    """
+
+    if anterior and anterior[2] == STATUS_MARCADA:
+        ajustar_contador(anterior[0], anterior[1], -1)
+
+    if agendamento.status == STATUS_MARCADA:
+        ajustar_contador(agendamento.medico_id, agendamento.data_hora, 1)
+
+
+def descontar_contadores(agendamentos):
+    """
+    Decrementa os contadores de uma lista de pares (medico_id, data_hora) que
+    deixaram de estar marcados, com um UPDATE por médico/dia.
+    """
+
+    totais = Counter(
+        (medico_id, timezone.localdate(data_hora))
+        for medico_id, data_hora in agendamentos
+    )
+
+    for (medico_id, dia), total in totais.items():
+        ContadorDiarioMedico.objects.filter(
+            medico_id=medico_id, dia=dia, marcadas__gte=total
+        ).update(marcadas=F("marcadas") - total)
+
+
+def marcadas_no_dia(medico_id, dia):
+    return (
+        ContadorDiarioMedico.objects.filter(medico_id=medico_id, dia=dia)
+        .values_list("marcadas", flat=True)
+        .first()
+        or 0
+    )
+
+
+def reconciliar_contadores(desde=None):
+    """
+    Recalcula os contadores a partir dos agendamentos marcados.
+
+    Apenas os dias a partir de `desde` (por padrão, hoje) são reconciliados.
+    Retorna o número de contadores corrigidos.
+    """
+
+    desde = desde or timezone.localdate()
+
+    reais = {
+        (linha["medico_id"], linha["dia"]): linha["total"]
+        for linha in AgendamentoConsulta.objects.filter(status=STATUS_MARCADA)
+        .annotate(dia=TruncDate("data_hora", tzinfo=timezone.get_current_timezone()))
+        .filter(dia__gte=desde)
+        .values("medico_id", "dia")
+        .annotate(total=Count("id"))
+    }
+
+    atuais = {
+        (contador.medico_id, contador.dia): contador
+        for contador in ContadorDiarioMedico.objects.filter(dia__gte=desde)
+    }
+
+    corrigidos = []
+
+    for chave, contador in atuais.items():
+        total = reais.get(chave, 0)
+
+        if contador.marcadas != total:
+            contador.marcadas = total
+            corrigidos.append(contador)
+
+    novos = [
+        ContadorDiarioMedico(medico_id=medico_id, dia=dia, marcadas=total)
+        for (medico_id, dia), total in reais.items()
+        if (medico_id, dia) not in atuais
+    ]
+
+    with transaction.atomic():
+        ContadorDiarioMedico.objects.bulk_update(corrigidos, ["marcadas"])
+        ContadorDiarioMedico.objects.bulk_create(novos, ignore_conflicts=True)
+
+    return len(corrigidos) + len(novos)
@@ -0,0 +1,232 @@
+import smtplib
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection, transaction
+from django.utils import timezone
+
+from gmp.consultas.constants import (
+    EMAIL_BACKOFF_BASE_SEGUNDOS,
+    EMAIL_BACKOFF_MAXIMO_SEGUNDOS,
+    EMAIL_CONEXAO_OCIOSA_SEGUNDOS,
+    EMAIL_MAX_TENTATIVAS,
+    EMAIL_RESERVA_SEGUNDOS,
+    EMAIL_TAMANHO_LOTE,
+    STATUS_EMAIL_ENVIADO,
+    STATUS_EMAIL_FALHOU,
+    STATUS_EMAIL_PENDENTE,
+)
+from gmp.consultas.models import EmailSaida
+
+# E-mails transacionais não são enviados durante a requisição: são gravados
+# na caixa de saída dentro da mesma transação que os originou (se ela for
+# desfeita, o e-mail também é) e entregues depois pelo worker `enviar_emails`.
+# Cada lote é reservado numa transação curta, adiando `proxima_tentativa_em`,
+# e enviado fora dela por uma única conexão SMTP. Falhas voltam para a fila
+# com backoff exponencial até EMAIL_MAX_TENTATIVAS.
+
+
+def enfileirar_email(destinatario, assunto, mensagem):
+    return EmailSaida.objects.create(
+        destinatario=destinatario, assunto=assunto, mensagem=mensagem
+    )
+
+
+def processar_caixa_saida(tamanho_lote=EMAIL_TAMANHO_LOTE, agora=None):
+    """
+    Envia um lote de e-mails pendentes e retorna (enviados, falhas).
+    """
+
+    emails = _reservar_lote(tamanho_lote, agora or timezone.now())
+
+    if not emails:
+        return 0, 0
+
+    falhas = dict(enviar_mensagens([_mensagem(email) for email in emails]))
+
+    enviados = [email.id for indice, email in enumerate(emails) if indice not in falhas]
+    falhas = [(emails[indice], erro) for indice, erro in falhas.items()]
+
+    EmailSaida.objects.filter(id__in=enviados).update(
+        status=STATUS_EMAIL_ENVIADO, enviado_em=timezone.now(), ultimo_erro=""
+    )
+    _registrar_falhas(falhas)
+
+    return len(enviados), len(falhas)
+
+
+def _reservar_lote(tamanho_lote, agora):
+
+    with transaction.atomic():
+
+        pendentes = EmailSaida.objects.filter(
+            status=STATUS_EMAIL_PENDENTE, proxima_tentativa_em__lte=agora
+        ).order_by("proxima_tentativa_em")
+
+        if connection.features.has_select_for_update_skip_locked:
+            pendentes = pendentes.select_for_update(skip_locked=True)
+
+        emails = list(pendentes[:tamanho_lote])
+
+        EmailSaida.objects.filter(id__in=[email.id for email in emails]).update(
+            proxima_tentativa_em=agora + timedelta(seconds=EMAIL_RESERVA_SEGUNDOS)
+        )
+
+    return emails
+
+
+def _registrar_falhas(falhas):
+
+    agora = timezone.now()
+
+    for email, erro in falhas:
+        email.tentativas += 1
+        email.ultimo_erro = str(erro)
+        email.proxima_tentativa_em = agora + _backoff(email.tentativas)
+
+        if email.tentativas >= EMAIL_MAX_TENTATIVAS:
+            email.status = STATUS_EMAIL_FALHOU
+
+    EmailSaida.objects.bulk_update(
+        [email for email, _ in falhas],
+        ["tentativas", "ultimo_erro", "proxima_tentativa_em", "status"],
+    )
+
+
+def _backoff(tentativas):
+    return timedelta(
+        seconds=min(
+            EMAIL_BACKOFF_BASE_SEGUNDOS * 2 ** (tentativas - 1),
+            EMAIL_BACKOFF_MAXIMO_SEGUNDOS,
+        )
+    )
+
+
+def _mensagem(email):
+    return EmailMessage(
+        subject=email.assunto,
+        body=email.mensagem,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[email.destinatario],
+    )
+
+
+# =========================
+# DESPACHO
+# =========================
+
+# Ponto único de envio de e-mails (caixa de saída, redefinição de senha,
+# lembretes). Cada thread mantém uma conexão com o backend aberta entre
+# envios, evitando um handshake SMTP + TLS por mensagem; ela é reaberta se
+# ficou ociosa por mais de EMAIL_CONEXAO_OCIOSA_SEGUNDOS ou se o servidor
+# encerrou a sessão. Envios avulsos feitos em threads de requisição chamam
+# `fechar_conexao()` ao final; só os workers mantêm a conexão aberta.
+
+_local = threading.local()
+_metricas_lock = threading.Lock()
+_metricas = {
+    "mensagens_enviadas": 0,
+    "falhas": 0,
+    "conexoes_abertas": 0,
+    "segundos_enviando": 0.0,
+}
+
+
+def enviar_mensagens(mensagens):
+    """
+    Envia `mensagens` pela conexão compartilhada e retorna a lista de falhas
+    como pares (índice da mensagem, exceção).
+    """
+
+    falhas = []
+    inicio = time.monotonic()
+
+    try:
+        _conexao()
+    except Exception as e:
+        # Sem conexão com o servidor não adianta tentar mensagem a mensagem.
+        falhas = [(indice, e) for indice in range(len(mensagens))]
+    else:
+        for indice, mensagem in enumerate(mensagens):
+            try:
+                _enviar(mensagem)
+            except Exception as e:
+                falhas.append((indice, e))
+
+    _registrar_metricas(
+        enviadas=len(mensagens) - len(falhas),
+        falhas=len(falhas),
+        segundos=time.monotonic() - inicio,
+    )
+
+    return falhas
+
+
+def metricas_email():
+
+    with _metricas_lock:
+        metricas = dict(_metricas)
+
+    segundos = metricas["segundos_enviando"]
+    metricas["mensagens_por_segundo"] = (
+        metricas["mensagens_enviadas"] / segundos if segundos else 0.0
+    )
+
+    return metricas
+
+
+def fechar_conexao():
+
+    conexao = getattr(_local, "conexao", None)
+    _local.conexao = None
+
+    if conexao is not None:
+        try:
+            conexao.close()
+        except Exception:
+            pass
+
+
+def _enviar(mensagem):
+
+    try:
+        _conexao().send_messages([mensagem])
+    except (smtplib.SMTPServerDisconnected, ConnectionError):
+        fechar_conexao()
+        _conexao().send_messages([mensagem])
+
+    _local.usada_em = time.monotonic()
+
+
+def _conexao():
+
+    conexao = getattr(_local, "conexao", None)
+
+    if (
+        conexao is not None
+        and time.monotonic() - _local.usada_em > EMAIL_CONEXAO_OCIOSA_SEGUNDOS
+    ):
+        fechar_conexao()
+        conexao = None
+
+    if conexao is None:
+        conexao = get_connection(fail_silently=False)
+        conexao.open()
+
+        _local.conexao = conexao
+        _local.usada_em = time.monotonic()
+        _registrar_metricas(conexoes=1)
+
+    return conexao
+
+
+def _registrar_metricas(enviadas=0, falhas=0, segundos=0.0, conexoes=0):
+
+    with _metricas_lock:
+        _metricas["mensagens_enviadas"] += enviadas
+        _metricas["falhas"] += falhas
+        _metricas["segundos_enviando"] += segundos
+        _metricas["conexoes_abertas"] += conexoes
@@ -0,0 +1,221 @@
+import heapq
+from datetime import timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from gmp.consultas.constants import (
+    HORIZONTE_EXPIRACAO_HORAS,
+    INTERVALO_SINCRONIZACAO_EXPIRACAO_SEGUNDOS,
+    PRAZO_REGISTRO_CONSULTA_HORAS,
+    STATUS_MARCADA,
+    STATUS_NAO_REALIZADA,
+    TAMANHO_LOTE_EXPIRACAO,
+)
+from gmp.consultas.models import AgendamentoConsulta
+from gmp.consultas.services.log_service import transacao_auditada
+from gmp.consultas.services.transicao_service import transicionar_lote
+
+# Consultas marcadas cujo prazo de registro passou são finalizadas como não
+# realizadas em lotes de tamanho fixo. Cada lote é uma transação curta (um
+# SELECT por chave, um UPDATE ... WHERE id IN (...) e um INSERT em massa dos
+# logs), então o backlog nunca é carregado inteiro em memória e o lock de
+# escrita do SQLite é liberado entre os lotes.
+
+PRAZO_REGISTRO = timedelta(hours=PRAZO_REGISTRO_CONSULTA_HORAS)
+
+
+def expirar_consultas(agora=None, tamanho_lote=TAMANHO_LOTE_EXPIRACAO):
+    """
+    Marca como não realizadas as consultas vencidas e retorna quantas foram
+    atualizadas.
+    """
+
+    return _expirar(Q(data_hora__lt=limite_expiracao(agora)), tamanho_lote)
+
+
+def expirar_consultas_por_id(ids, agora=None, tamanho_lote=TAMANHO_LOTE_EXPIRACAO):
+    """
+    Expira, dentre os `ids` informados, apenas as consultas que continuam
+    marcadas e vencidas no banco.
+    """
+
+    return _expirar(
+        Q(id__in=list(ids), data_hora__lt=limite_expiracao(agora)), tamanho_lote
+    )
+
+
+def limite_expiracao(agora=None):
+    return (agora or timezone.now()) - PRAZO_REGISTRO
+
+
+def _expirar(filtro, tamanho_lote):
+
+    total = 0
+    ultimo_id = 0
+
+    while True:
+        atualizadas, ultimo_id = _expirar_lote(filtro, ultimo_id, tamanho_lote)
+
+        if ultimo_id is None:
+            return total
+
+        total += atualizadas
+
+
+def _expirar_lote(filtro, ultimo_id, tamanho_lote):
+
+    with transacao_auditada():
+
+        lote = list(
+            AgendamentoConsulta.objects.select_for_update()
+            .filter(filtro, id__gt=ultimo_id, status=STATUS_MARCADA)
+            .order_by("id")
+            .values_list("id", "medico_id", "data_hora")[:tamanho_lote]
+        )
+
+        if not lote:
+            return 0, None
+
+        ultimo_id = lote[-1][0]
+        atualizado_em = timezone.now()
+
+        atualizadas = AgendamentoConsulta.objects.filter(
+            id__in=[agendamento_id for agendamento_id, _, _ in lote],
+            status=STATUS_MARCADA,
+        ).update(status=STATUS_NAO_REALIZADA, atualizado_em=atualizado_em)
+
+        if atualizadas < len(lote):
+            # Em bancos sem SELECT ... FOR UPDATE, parte do lote pode ter
+            # mudado de status entre a leitura e o UPDATE.
+            expiradas = set(
+                AgendamentoConsulta.objects.filter(
+                    id__in=[agendamento_id for agendamento_id, _, _ in lote],
+                    status=STATUS_NAO_REALIZADA,
+                    atualizado_em=atualizado_em,
+                ).values_list("id", flat=True)
+            )
+            lote = [linha for linha in lote if linha[0] in expiradas]
+
+        transicionar_lote(lote, STATUS_MARCADA, STATUS_NAO_REALIZADA)
+
+    return atualizadas, ultimo_id
+
+
+# =========================
+# AGENDA DE EXPIRAÇÃO
+# =========================
+
+# Usada pelo daemon `agendar_expiracoes`: mantém em memória um min-heap com os
+# prazos de expiração das consultas marcadas dentro do horizonte, para que cada
+# consulta seja finalizada no instante em que vence. O heap é montado uma vez
+# e depois alimentado de forma incremental: pelo avanço do horizonte (faixa
+# nova de `data_hora`) e pelas consultas alteradas desde a última
+# sincronização (`atualizado_em`). Entradas obsoletas (consulta remarcada,
+# cancelada ou realizada) são descartadas na retirada, e o banco é sempre
+# consultado de novo antes de expirar.
+
+
+class AgendaExpiracao:
+
+    def __init__(
+        self,
+        horizonte=timedelta(hours=HORIZONTE_EXPIRACAO_HORAS),
+        intervalo_sincronizacao=timedelta(
+            seconds=INTERVALO_SINCRONIZACAO_EXPIRACAO_SEGUNDOS
+        ),
+    ):
+        self.horizonte = horizonte
+        self.intervalo_sincronizacao = intervalo_sincronizacao
+        self.prazos = {}
+        self._heap = []
+        self._carregado_ate = None
+        self._sincronizado_em = None
+
+    def __len__(self):
+        return len(self.prazos)
+
+    def carregar(self, agora=None):
+        """Expira o backlog e monta o heap com os prazos do horizonte."""
+
+        agora = agora or timezone.now()
+
+        self._sincronizado_em = agora
+        total = expirar_consultas(agora)
+
+        self._carregado_ate = agora
+        self._estender_horizonte(agora)
+
+        return total
+
+    def sincronizar(self, agora=None):
+        """Agenda as consultas criadas ou alteradas desde a última chamada."""
+
+        agora = agora or timezone.now()
+
+        # A margem cobre commits feitos com `atualizado_em` anterior à última
+        # sincronização; entradas repetidas são ignoradas em `_agendar`.
+        alteradas = AgendamentoConsulta.objects.filter(
+            status=STATUS_MARCADA,
+            atualizado_em__gte=self._sincronizado_em - self.intervalo_sincronizacao,
+            data_hora__lt=self._carregado_ate - PRAZO_REGISTRO,
+        ).values_list("id", "data_hora")
+
+        self._sincronizado_em = agora
+        self._agendar(alteradas)
+        self._estender_horizonte(agora)
+
+    def expirar_vencidas(self, agora=None):
+
+        agora = agora or timezone.now()
+        vencidas = []
+
+        while self._heap and self._heap[0][0] <= agora:
+            prazo, agendamento_id = heapq.heappop(self._heap)
+
+            if self.prazos.get(agendamento_id) == prazo:
+                del self.prazos[agendamento_id]
+                vencidas.append(agendamento_id)
+
+        if not vencidas:
+            return 0
+
+        return expirar_consultas_por_id(vencidas, agora)
+
+    def segundos_ate_proximo(self, agora=None):
+
+        agora = agora or timezone.now()
+        espera = self.intervalo_sincronizacao
+
+        if self._heap:
+            espera = min(espera, self._heap[0][0] - agora)
+
+        return max(espera.total_seconds(), 0)
+
+    def _estender_horizonte(self, agora):
+
+        fim = agora + self.horizonte
+
+        if fim <= self._carregado_ate:
+            return
+
+        self._agendar(
+            AgendamentoConsulta.objects.filter(
+                status=STATUS_MARCADA,
+                data_hora__gte=self._carregado_ate - PRAZO_REGISTRO,
+                data_hora__lt=fim - PRAZO_REGISTRO,
+            )
+            .values_list("id", "data_hora")
+            .iterator(chunk_size=TAMANHO_LOTE_EXPIRACAO)
+        )
+
+        self._carregado_ate = fim
+
+    def _agendar(self, agendamentos):
+
+        for agendamento_id, data_hora in agendamentos:
+            prazo = data_hora + PRAZO_REGISTRO
+
+            if self.prazos.get(agendamento_id) != prazo:
+                self.prazos[agendamento_id] = prazo
+                heapq.heappush(self._heap, (prazo, agendamento_id))
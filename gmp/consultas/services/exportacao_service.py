@@ -0,0 +1,93 @@
+import tempfile
+import zipfile
+
+from gmp.consultas.constants import (
+    EXPORTACAO_CHUNK_BYTES,
+    EXPORTACAO_RECEITAS_LOTE,
+)
+from gmp.consultas.services.receita_service import (
+    dados_receita_consulta,
+    pdf_receita_consulta,
+)
+from gmp.consultas.utils.modelo_receita import modelo_receita
+
+# Exportação de várias receitas numa única resposta. As consultas são lidas
+# em streaming. No ZIP entram os PDFs já gravados em `receita_pdf` (as
+# receitas ainda sem arquivo são renderizadas com o mesmo modelo); cada PDF
+# é escrito e entregue ao cliente antes de o próximo ser lido, então a
+# memória não cresce com a quantidade. No PDF único, o ReportLab só grava o
+# arquivo ao final: o documento é montado num arquivo temporário e
+# transmitido em blocos.
+#
+# As duas exportações rodam na thread da requisição enquanto a resposta é
+# transmitida, sem o pool de renderização: um job recusado no meio da
+# resposta a truncaria. O custo fica no worker WSGI, que está ocupado por
+# toda a exportação. O ZIP só renderiza receitas ainda sem arquivo. O PDF
+# único renderiza todas, por isso a view o limita a
+# EXPORTACAO_RECEITAS_LIMITE_PDF receitas (cerca de um segundo de ReportLab).
+
+
+def exportar_receitas_zip(consultas):
+    """Gera os bytes de um ZIP com um PDF por receita, à medida que ficam prontos."""
+
+    saida = _SaidaStream()
+
+    with zipfile.ZipFile(saida, mode="w", compression=zipfile.ZIP_STORED) as arquivo:
+        for consulta in consultas.iterator(chunk_size=EXPORTACAO_RECEITAS_LOTE):
+            arquivo.writestr(
+                _nome_arquivo(consulta),
+                pdf_receita_consulta(consulta),
+            )
+
+            yield saida.drenar()
+
+    yield saida.drenar()
+
+
+def exportar_receitas_pdf(consultas):
+    """Gera os bytes de um único PDF com uma receita por página."""
+
+    with tempfile.TemporaryFile() as arquivo:
+        modelo_receita().renderizar_varias(
+            arquivo,
+            (
+                dados_receita_consulta(consulta)
+                for consulta in consultas.iterator(chunk_size=EXPORTACAO_RECEITAS_LOTE)
+            ),
+        )
+
+        arquivo.seek(0)
+
+        while bloco := arquivo.read(EXPORTACAO_CHUNK_BYTES):
+            yield bloco
+
+
+def _nome_arquivo(consulta):
+    return f"receita_{consulta.agendamento.data_hora:%Y%m%d}_{consulta.protocolo}.pdf"
+
+
+class _SaidaStream:
+    """
+    Destino não posicionável para o ZipFile: acumula o que foi escrito até a
+    próxima chamada de `drenar`.
+    """
+
+    def __init__(self):
+        self._partes = []
+        self._posicao = 0
+
+    def write(self, dados):
+        self._partes.append(bytes(dados))
+        self._posicao += len(dados)
+        return len(dados)
+
+    def tell(self):
+        return self._posicao
+
+    def flush(self):
+        pass
+
+    def drenar(self):
+        dados = b"".join(self._partes)
+        self._partes = []
+        return dados
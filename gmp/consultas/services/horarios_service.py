@@ -1,20 +1,25 @@
-from datetime import datetime, time, timedelta
+from datetime import datetime, timedelta
 
 from django.utils import timezone
 
 from gmp.consultas.constants import (
     ANTECEDENCIA_MINIMA_HORAS,
-    CACHE_TIMEOUT_HORARIOS,
     DIA_UTIL_FINAL,
     FORMATO_DATA,
-    FORMATO_HORA,
-    HORA_FIM_ATENDIMENTO,
-    HORA_INICIO_ATENDIMENTO,
-    INTERVALO_MINUTOS,
+    LIMITE_DIAS_PERIODO_HORARIOS,
+    LIMITE_MEDICOS_PERIODO_HORARIOS,
+)
+from gmp.consultas.exceptions import PeriodoHorariosInvalidoError
+from gmp.consultas.selectors import (
+    agendamentos_marcados_no_periodo,
+    dias_lotados_do_medico,
+)
+from gmp.consultas.services.cache_service import obter_ocupacoes
+from gmp.consultas.utils.grade_horarios import (
+    bit_do_horario,
+    horarios_da_mascara,
+    mascara_antecedencia,
 )
-from gmp.consultas.models import AgendamentoConsulta
-from gmp.consultas.services.cache_service import get_cache, set_cache
-from gmp.consultas.utils.cache_keys import horarios_medico_key
 
 
 def horarios_disponiveis_service(medico_id, data_str):
@@ -22,42 +27,126 @@ def horarios_disponiveis_service(medico_id, data_str):
     if not medico_id or not data_str:
         return []
 
-    cache_key = horarios_medico_key(medico_id, data_str)
-    cached = get_cache(cache_key)
-
-    if cached is not None:
-        return cached
-
     data = datetime.strptime(data_str, FORMATO_DATA).date()
 
     if data.weekday() > DIA_UTIL_FINAL:
         return []
 
-    agora = timezone.now()
-    minimo = agora + timedelta(hours=ANTECEDENCIA_MINIMA_HORAS)
+    minimo = timezone.now() + timedelta(hours=ANTECEDENCIA_MINIMA_HORAS)
+    permitidos = mascara_antecedencia(data, minimo)
+
+    if not permitidos:
+        return []
+
+    par = (int(medico_id), data)
+    ocupados = obter_ocupacoes([par], _carregar_ocupacoes)[par]
+
+    return list(horarios_da_mascara(permitidos & ~ocupados))
+
+
+def horarios_disponiveis_periodo_service(medico_ids, data_inicio_str, data_fim_str):
+
+    try:
+        medico_ids = sorted({int(medico_id) for medico_id in medico_ids})
+    except ValueError:
+        medico_ids = []
+
+    if not medico_ids or len(medico_ids) > LIMITE_MEDICOS_PERIODO_HORARIOS:
+        raise _periodo_invalido()
+
+    data_inicio, data_fim = _validar_periodo(data_inicio_str, data_fim_str)
+
+    minimo = timezone.now() + timedelta(hours=ANTECEDENCIA_MINIMA_HORAS)
+
+    dias = [
+        data_inicio + timedelta(days=i)
+        for i in range((data_fim - data_inicio).days + 1)
+    ]
+
+    permitidos = {
+        dia: (
+            mascara_antecedencia(dia, minimo) if dia.weekday() <= DIA_UTIL_FINAL else 0
+        )
+        for dia in dias
+    }
+
+    ocupacoes = obter_ocupacoes(
+        [
+            (medico_id, dia)
+            for medico_id in medico_ids
+            for dia in dias
+            if permitidos[dia]
+        ],
+        _carregar_ocupacoes,
+    )
+
+    return {
+        str(medico_id): {
+            dia.strftime(FORMATO_DATA): list(
+                horarios_da_mascara(
+                    permitidos[dia] & ~ocupacoes.get((medico_id, dia), 0)
+                )
+            )
+            for dia in dias
+        }
+        for medico_id in medico_ids
+    }
+
+
+def dias_lotados_service(medico_id, data_inicio_str, data_fim_str):
+
+    try:
+        medico_id = int(medico_id)
+    except (TypeError, ValueError):
+        raise _periodo_invalido()
+
+    data_inicio, data_fim = _validar_periodo(data_inicio_str, data_fim_str)
+
+    return [
+        dia.strftime(FORMATO_DATA)
+        for dia in dias_lotados_do_medico(medico_id, data_inicio, data_fim)
+    ]
 
-    horarios = []
 
-    for h in range(HORA_INICIO_ATENDIMENTO, HORA_FIM_ATENDIMENTO):
-        for m in INTERVALO_MINUTOS:
-            dt = timezone.make_aware(datetime.combine(data, time(h, m)))
-            if dt >= minimo:
-                horarios.append(dt)
+def _validar_periodo(data_inicio_str, data_fim_str):
 
-    ocupados = (
-        AgendamentoConsulta.objects.only("data_hora")
-        .filter(
-            medico_id=medico_id,
-            data_hora__date=data,
-            status=AgendamentoConsulta.STATUS_MARCADA,
+    try:
+        data_inicio = datetime.strptime(data_inicio_str or "", FORMATO_DATA).date()
+        data_fim = datetime.strptime(data_fim_str or "", FORMATO_DATA).date()
+    except ValueError:
+        raise _periodo_invalido()
+
+    if (
+        data_fim < data_inicio
+        or (data_fim - data_inicio).days >= LIMITE_DIAS_PERIODO_HORARIOS
+    ):
+        raise _periodo_invalido()
+
+    return data_inicio, data_fim
+
+
+def _periodo_invalido():
+    return PeriodoHorariosInvalidoError(
+        PeriodoHorariosInvalidoError.default_message.format(
+            dias=LIMITE_DIAS_PERIODO_HORARIOS
         )
-        .values_list("data_hora", flat=True)
     )
 
-    ocupados = set(ocupados)
 
-    disponiveis = [h.strftime(FORMATO_HORA) for h in horarios if h not in ocupados]
+def _carregar_ocupacoes(pares):
+
+    dias = [dia for _, dia in pares]
+
+    ocupados = agendamentos_marcados_no_periodo(
+        {medico_id for medico_id, _ in pares}, min(dias), max(dias)
+    ).values_list("medico_id", "data_hora")
+
+    mascaras = {par: 0 for par in pares}
+
+    for medico_id, data_hora in ocupados:
+        par = (medico_id, timezone.localtime(data_hora).date())
 
-    set_cache(cache_key, disponiveis, CACHE_TIMEOUT_HORARIOS)
+        if par in mascaras:
+            mascaras[par] |= bit_do_horario(data_hora)
 
-    return disponiveis
+    return mascaras
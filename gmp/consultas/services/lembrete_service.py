@@ -0,0 +1,94 @@
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.utils import timezone
+
+from gmp.consultas.constants import (
+    EMAIL_ASSUNTO_LEMBRETE_CONSULTA,
+    EMAIL_MENSAGEM_LEMBRETE_CONSULTA,
+    FORMATO_DATA,
+    FORMATO_HORA,
+    LEMBRETE_ANTECEDENCIA_HORAS,
+    LEMBRETE_TAMANHO_LOTE,
+    STATUS_MARCADA,
+)
+from gmp.consultas.models import AgendamentoConsulta, LembreteConsulta
+from gmp.consultas.services.email_service import enviar_mensagens
+
+# Os lembretes percorrem as consultas marcadas da janela em streaming
+# (`iterator`), lendo apenas as colunas usadas na mensagem, e são enviados em
+# lotes pela conexão compartilhada do serviço de e-mail. Cada lote enviado é
+# registrado em LembreteConsulta, que também exclui da leitura as consultas já
+# lembradas: reexecutar o comando não reenvia lembretes.
+
+FORMATO_DATA_HORA_LEMBRETE = FORMATO_DATA + " às " + FORMATO_HORA
+
+
+def enviar_lembretes(
+    agora=None,
+    antecedencia=timedelta(hours=LEMBRETE_ANTECEDENCIA_HORAS),
+    tamanho_lote=LEMBRETE_TAMANHO_LOTE,
+):
+    """
+    Envia os lembretes das consultas marcadas nas próximas `antecedencia`
+    horas e retorna (enviados, falhas).
+    """
+
+    agora = agora or timezone.now()
+
+    consultas = (
+        AgendamentoConsulta.objects.filter(
+            status=STATUS_MARCADA,
+            data_hora__gte=agora,
+            data_hora__lt=agora + antecedencia,
+            lembrete__isnull=True,
+        )
+        .order_by()
+        .values_list(
+            "id", "data_hora", "paciente__email", "paciente__nome", "medico__nome"
+        )
+        .iterator(chunk_size=tamanho_lote)
+    )
+
+    enviados = 0
+    falhas = 0
+
+    while lote := list(islice(consultas, tamanho_lote)):
+        enviados_lote, falhas_lote = _enviar_lote(lote)
+        enviados += enviados_lote
+        falhas += falhas_lote
+
+    return enviados, falhas
+
+
+def _enviar_lote(lote):
+
+    falhas = dict(enviar_mensagens([_mensagem(*consulta) for consulta in lote]))
+
+    LembreteConsulta.objects.bulk_create(
+        [
+            LembreteConsulta(agendamento_id=consulta[0])
+            for indice, consulta in enumerate(lote)
+            if indice not in falhas
+        ],
+        ignore_conflicts=True,
+    )
+
+    return len(lote) - len(falhas), len(falhas)
+
+
+def _mensagem(_, data_hora, email, paciente, medico):
+    return EmailMessage(
+        subject=EMAIL_ASSUNTO_LEMBRETE_CONSULTA,
+        body=EMAIL_MENSAGEM_LEMBRETE_CONSULTA.format(
+            paciente=paciente,
+            medico=medico,
+            data_hora=timezone.localtime(data_hora).strftime(
+                FORMATO_DATA_HORA_LEMBRETE
+            ),
+        ),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[email],
+    )
@@ -1,10 +1,132 @@
+import logging
+import queue
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from gmp.consultas.constants import LOG_TAMANHO_LOTE_ASSINCRONO
 from gmp.consultas.models import ConsultaLog
+from gmp.consultas.services.cache_service import invalidar_timelines
+
+logger = logging.getLogger(__name__)
+
+# Os serviços abrem suas transações com `transacao_auditada()`: dentro dela,
+# `registrar_log` só acumula os registros, gravados com um único bulk_create
+# ao final do bloco, ainda dentro da transação (se ela for desfeita, os
+# registros também são). Com settings.CONSULTA_LOG_ASSINCRONO, o lote é
+# entregue após o commit a uma thread que grava os lotes da fila juntos,
+# tirando a escrita do log da requisição; registros ainda na fila se perdem
+# se o processo cair. Fora de `transacao_auditada()`, o registro é gravado
+# na hora.
+
+_local = threading.local()
+_fila = queue.Queue()
+_trabalhador = None
+_trabalhador_lock = threading.Lock()
 
 
 def registrar_log(consulta, usuario, status_anterior, status_novo):
-    ConsultaLog.objects.create(
+
+    log = ConsultaLog(
         consulta=consulta,
         usuario=usuario,
         status_anterior=status_anterior,
         status_novo=status_novo,
     )
+
+    lotes = getattr(_local, "lotes", None)
+
+    if lotes:
+        lotes[-1].append(log)
+    else:
+        log.save()
+        invalidar_timelines([log.consulta_id])
+
+    return log
+
+
+@contextmanager
+def transacao_auditada():
+
+    lote = []
+
+    with transaction.atomic():
+
+        _local.lotes = getattr(_local, "lotes", [])
+        _local.lotes.append(lote)
+
+        try:
+            yield
+        finally:
+            _local.lotes.pop()
+
+        if lote:
+            if getattr(settings, "CONSULTA_LOG_ASSINCRONO", False):
+                transaction.on_commit(lambda: _enfileirar(lote))
+            else:
+                ConsultaLog.objects.bulk_create(lote)
+                invalidar_timelines({log.consulta_id for log in lote})
+
+
+def gravar_fila(bloquear=True):
+    """
+    Grava numa única inserção os lotes da fila (até
+    LOG_TAMANHO_LOTE_ASSINCRONO registros) e retorna quantos foram gravados.
+    """
+
+    try:
+        lotes = [_fila.get(block=bloquear)]
+    except queue.Empty:
+        return 0
+
+    logs = list(lotes[0])
+
+    while len(logs) < LOG_TAMANHO_LOTE_ASSINCRONO:
+        try:
+            lotes.append(_fila.get_nowait())
+        except queue.Empty:
+            break
+
+        logs.extend(lotes[-1])
+
+    try:
+        ConsultaLog.objects.bulk_create(logs)
+        invalidar_timelines({log.consulta_id for log in logs})
+    except Exception:
+        logger.exception("Falha ao gravar %s registros de ConsultaLog", len(logs))
+    finally:
+        for _ in lotes:
+            _fila.task_done()
+
+    return len(logs)
+
+
+def aguardar_fila():
+    """Bloqueia até a thread gravar todos os lotes enfileirados."""
+
+    _fila.join()
+
+
+def _enfileirar(lote):
+    _iniciar_trabalhador()
+    _fila.put(lote)
+
+
+def _iniciar_trabalhador():
+    global _trabalhador
+
+    with _trabalhador_lock:
+        if _trabalhador is None or not _trabalhador.is_alive():
+            _trabalhador = threading.Thread(
+                target=_executar, name="consulta-log", daemon=True
+            )
+            _trabalhador.start()
+
+
+def _executar():
+
+    while True:
+        gravar_fila()
+        close_old_connections()
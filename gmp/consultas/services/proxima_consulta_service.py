@@ -0,0 +1,37 @@
+from django.db.models import OuterRef, Subquery
+
+from gmp.consultas.constants import STATUS_MARCADA
+from gmp.consultas.models import AgendamentoConsulta
+from gmp.usuarios.models import CustomUser
+
+# CustomUser.proxima_consulta / proxima_consulta_em apontam para o agendamento
+# marcado mais distante de cada paciente. São recalculados com um único UPDATE
+# (subconsulta por paciente) sempre que uma transição pode alterá-los.
+
+
+def recalcular_proxima_consulta(pacientes):
+    """
+    Recalcula o ponteiro dos pacientes do queryset `pacientes` e retorna
+    quantos foram atualizados.
+    """
+
+    ultima_marcada = AgendamentoConsulta.objects.filter(
+        paciente=OuterRef("pk"), status=STATUS_MARCADA
+    ).order_by("-data_hora", "-id")
+
+    return pacientes.update(
+        proxima_consulta=Subquery(ultima_marcada.values("id")[:1]),
+        proxima_consulta_em=Subquery(ultima_marcada.values("data_hora")[:1]),
+    )
+
+
+def sincronizar_proxima_consulta(agendamento, anterior=None):
+    recalcular_proxima_consulta(CustomUser.objects.filter(pk=agendamento.paciente_id))
+
+
+def sincronizar_proximas_consultas(agendamento_ids):
+    """Recalcula os pacientes cujo ponteiro está entre `agendamento_ids`."""
+
+    recalcular_proxima_consulta(
+        CustomUser.objects.filter(proxima_consulta_id__in=agendamento_ids)
+    )
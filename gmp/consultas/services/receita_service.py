@@ -1,20 +1,20 @@
+import hashlib
+import json
+import mimetypes
 from io import BytesIO
+from pathlib import PurePosixPath
 
-from django.db import transaction
+from django.core.files.base import ContentFile
 from django.utils import timezone
-from reportlab.graphics.barcode import qr
-from reportlab.graphics.shapes import Drawing
-from reportlab.lib import colors
-from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
-from reportlab.lib.units import inch
-from reportlab.platypus import HRFlowable, Paragraph, SimpleDocTemplate, Spacer
 
 from gmp.consultas.constants import (
+    CACHE_PREVIEW_RECEITA_BYTES,
     FORMATO_DATA,
     FORMATO_HORA,
     MSG_ERRO_CRM_DESCRICAO_OBRIGATORIOS,
     MSG_ERRO_RECEITA_NAO_PERMITIDA,
     MSG_ERRO_SEM_PERMISSAO,
+    RECEITA_PDF_DIRETORIO,
 )
 from gmp.consultas.exceptions import (
     ConsultaError,
@@ -22,6 +22,12 @@ from gmp.consultas.exceptions import (
     DadosReceitaInvalidosError,
 )
 from gmp.consultas.models import AgendamentoConsulta, ConsultaLog
+from gmp.consultas.services.log_service import registrar_log, transacao_auditada
+from gmp.consultas.services.renderizacao_service import renderizar_pdf_receita
+from gmp.consultas.utils.cache_lru import CacheLRU
+from gmp.consultas.utils.modelo_receita import ModeloReceita, renderizar_receita
+
+_previews = CacheLRU(CACHE_PREVIEW_RECEITA_BYTES)
 
 
 def gerar_receita_pdf(agendamento, medico_nome, crm, descricao):
@@ -35,75 +41,101 @@ def gerar_receita_pdf(agendamento, medico_nome, crm, descricao):
     ]:
         raise ConsultaStatusInvalidoError(MSG_ERRO_RECEITA_NAO_PERMITIDA)
 
-    buffer = BytesIO()
-
-    doc = SimpleDocTemplate(
-        buffer, rightMargin=40, leftMargin=40, topMargin=60, bottomMargin=40
+    pdf = renderizar_pdf_receita(
+        _dados_receita(agendamento, medico_nome, crm, descricao, timezone.now())
     )
 
-    elements = []
-    styles = getSampleStyleSheet()
+    return BytesIO(pdf)
+
 
-    titulo_style = ParagraphStyle(
-        "Titulo",
-        parent=styles["Heading1"],
-        textColor=colors.HexColor("#065f46"),
-        fontSize=18,
+def dados_receita_consulta(consulta):
+    """Job de renderização da receita já finalizada de uma consulta."""
+
+    agendamento = consulta.agendamento
+
+    return _dados_receita(
+        agendamento,
+        agendamento.medico.nome,
+        consulta.crm_medico,
+        consulta.descricao_receita,
+        consulta.data_geracao_receita,
+        protocolo=consulta.protocolo,
     )
 
-    normal_style = styles["Normal"]
 
-    elements.append(Paragraph("G.M.P - Receita Médica", titulo_style))
-    elements.append(Spacer(1, 0.3 * inch))
+def armazenar_receita_pdf(consulta):
+    """
+    Renderiza a receita finalizada da consulta uma única vez e a grava em
+    `receita_pdf`, nomeada pelo sha256 do conteúdo: PDFs idênticos ocupam um
+    único arquivo no storage.
+    """
 
-    elements.append(Paragraph(f"Médico: {medico_nome}", normal_style))
-    elements.append(Paragraph(f"CRM: {crm}", normal_style))
-    elements.append(Spacer(1, 0.2 * inch))
+    if not consulta.crm_medico or not consulta.descricao_receita:
+        raise DadosReceitaInvalidosError()
 
-    elements.append(Paragraph(f"Paciente: {agendamento.paciente.nome}", normal_style))
-    elements.append(Paragraph(f"Idade: {agendamento.paciente.idade}", normal_style))
-    elements.append(Spacer(1, 0.2 * inch))
+    if consulta.data_geracao_receita is None:
+        consulta.data_geracao_receita = timezone.now()
 
-    elements.append(HRFlowable(width="100%", thickness=1, color=colors.grey))
-    elements.append(Spacer(1, 0.2 * inch))
+    pdf = renderizar_pdf_receita(dados_receita_consulta(consulta))
+    nome = f"{RECEITA_PDF_DIRETORIO}/{hashlib.sha256(pdf).hexdigest()}.pdf"
+    storage = consulta.receita_pdf.storage
 
-    elements.append(Paragraph("Descrição da Receita:", styles["Heading3"]))
-    elements.append(Spacer(1, 0.2 * inch))
-    elements.append(Paragraph(descricao.replace("\n", "<br/>"), normal_style))
+    if not storage.exists(nome):
+        nome = storage.save(nome, ContentFile(pdf))
 
-    elements.append(Spacer(1, 0.5 * inch))
+    consulta.receita_pdf = nome
+    consulta.save(update_fields=["receita_pdf", "data_geracao_receita"])
 
-    elements.append(
-        Paragraph(
-            f"Data: {timezone.now().strftime(FORMATO_DATA + ' ' + FORMATO_HORA)}",
-            normal_style,
-        )
-    )
+    return consulta.receita_pdf
 
-    elements.append(Spacer(1, 0.5 * inch))
-    elements.append(
-        Paragraph("Assinatura: ________________________________", normal_style)
-    )
 
-    qr_code = qr.QrCodeWidget(str(agendamento.id))
-    bounds = qr_code.getBounds()
-    size = 100
-    width = bounds[2] - bounds[0]
-    height = bounds[3] - bounds[1]
+def etag_receita_pdf(consulta):
+    # O nome do arquivo já é o hash do conteúdo.
+    return f'"{PurePosixPath(consulta.receita_pdf.name).stem}"'
+
+
+def pdf_receita_consulta(consulta):
+    """
+    Bytes da receita finalizada: o arquivo gravado ou, na falta dele,
+    renderizado. Usado pela exportação em ZIP, que é transmitida pela thread
+    da requisição: a renderização acontece nela mesma, sem o pool de
+    `renderizar_pdf_receita`, que poderia recusar o job no meio da resposta e
+    truncar o ZIP. Só receitas anteriores ao armazenamento são renderizadas.
+    """
+
+    if consulta.receita_pdf:
+        with consulta.receita_pdf.open("rb") as arquivo:
+            return arquivo.read()
 
-    drawing = Drawing(size, size, transform=[size / width, 0, 0, size / height, 0, 0])
-    drawing.add(qr_code)
+    return renderizar_receita(dados_receita_consulta(consulta))
 
-    elements.append(Spacer(1, 0.5 * inch))
-    elements.append(drawing)
 
-    doc.build(elements)
-    buffer.seek(0)
+def _dados_receita(agendamento, medico_nome, crm, descricao, gerada_em, protocolo=None):
+    # O QR aponta para o protocolo da consulta, que só existe na receita
+    # finalizada; o preview sai sem QR.
+    return {
+        "medico_nome": medico_nome,
+        "crm": crm,
+        "paciente_nome": agendamento.paciente.nome,
+        "paciente_idade": agendamento.paciente.idade,
+        "descricao": descricao,
+        "data": timezone.localtime(gerada_em).strftime(
+            FORMATO_DATA + " " + FORMATO_HORA
+        ),
+        "qr_payload": str(protocolo) if protocolo else None,
+    }
 
-    return buffer
 
+def gerar_receita_preview_service(
+    agendamento, usuario, crm, descricao, etags_cliente=()
+):
+    """
+    Retorna (etag, pdf) do preview da receita.
 
-def gerar_receita_preview_service(agendamento, usuario, crm, descricao):
+    Previews idênticos são servidos do cache, sem ReportLab nem escrita de
+    log; `pdf` é None quando o cliente já possui a versão atual (`etag` em
+    `etags_cliente`, vindo de If-None-Match).
+    """
 
     if usuario.role != usuario.ROLE_MEDICO:
         raise ConsultaError(MSG_ERRO_SEM_PERMISSAO)
@@ -117,19 +149,52 @@ def gerar_receita_preview_service(agendamento, usuario, crm, descricao):
     if not crm or not descricao:
         raise ConsultaError(MSG_ERRO_CRM_DESCRICAO_OBRIGATORIOS)
 
-    pdf_buffer = gerar_receita_pdf(
-        agendamento=agendamento, medico_nome=usuario.nome, crm=crm, descricao=descricao
+    etag = _etag_preview(agendamento, usuario, crm, descricao)
+
+    if etag in etags_cliente or "*" in etags_cliente:
+        return etag, None
+
+    pdf = _previews.get(etag)
+
+    if pdf is None:
+        pdf = gerar_receita_pdf(
+            agendamento=agendamento,
+            medico_nome=usuario.nome,
+            crm=crm,
+            descricao=descricao,
+        ).getvalue()
+
+        with transacao_auditada():
+            registrar_log(
+                consulta=agendamento,
+                usuario=usuario,
+                status_anterior=agendamento.status,
+                status_novo=ConsultaLog.STATUS_RECEITA_GERADA,
+            )
+
+        _previews.set(etag, pdf)
+
+    return etag, pdf
+
+
+def _etag_preview(agendamento, usuario, crm, descricao):
+    # Endereça o preview pelo conteúdo renderizado; a data (sem hora) entra
+    # na chave para que um preview não atravesse dias.
+    conteudo = json.dumps(
+        [
+            ModeloReceita.VERSAO,
+            agendamento.id,
+            agendamento.paciente.nome,
+            agendamento.paciente.idade,
+            usuario.id,
+            usuario.nome,
+            crm,
+            descricao,
+            timezone.localdate().isoformat(),
+        ]
     )
 
-    with transaction.atomic():
-        ConsultaLog.objects.create(
-            consulta=agendamento,
-            usuario=usuario,
-            status_anterior=agendamento.status,
-            status_novo=ConsultaLog.STATUS_RECEITA_GERADA,
-        )
-
-    return pdf_buffer
+    return f'"{hashlib.sha256(conteudo.encode()).hexdigest()}"'
 
 
 def validar_visualizacao_receita_service(agendamento, usuario):
@@ -152,3 +217,46 @@ def validar_visualizacao_receita_service(agendamento, usuario):
         raise ConsultaError(MSG_ERRO_SEM_PERMISSAO)
 
     return agendamento.consulta
+
+
+def receita_pdf_service(agendamento, usuario):
+    """
+    Arquivo da receita da consulta pronto para download, com os argumentos
+    de `resposta_arquivo`. A receita finalizada tem precedência; receitas
+    finalizadas antes do armazenamento são gravadas no primeiro acesso. Sem
+    ela, é servida a receita enviada como arquivo (`Consulta.receita`).
+    """
+
+    consulta = validar_visualizacao_receita_service(agendamento, usuario)
+
+    if not consulta.receita_pdf and consulta.crm_medico and consulta.descricao_receita:
+        armazenar_receita_pdf(consulta)
+
+    if consulta.receita_pdf:
+        return {
+            "arquivo": consulta.receita_pdf,
+            "etag": etag_receita_pdf(consulta),
+            "modificado_em": consulta.data_geracao_receita,
+            "nome": f"receita_{consulta.protocolo}.pdf",
+            "content_type": "application/pdf",
+        }
+
+    if consulta.receita:
+        return _arquivo_receita_enviada(consulta)
+
+    raise DadosReceitaInvalidosError()
+
+
+def _arquivo_receita_enviada(consulta):
+    # O arquivo enviado só é gravado na criação da consulta e o storage não
+    # reutiliza nomes, então o nome identifica o conteúdo.
+    caminho = PurePosixPath(consulta.receita.name)
+
+    return {
+        "arquivo": consulta.receita,
+        "etag": hashlib.sha256(caminho.as_posix().encode()).hexdigest(),
+        "modificado_em": consulta.criado_em,
+        "nome": f"receita_{consulta.protocolo}{caminho.suffix}",
+        "content_type": mimetypes.guess_type(caminho.name)[0]
+        or "application/octet-stream",
+    }
@@ -0,0 +1,127 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+from gmp.consultas.constants import (
+    RECEITA_PDF_FILA_POR_PROCESSO,
+    RECEITA_PDF_TIMEOUT_SEGUNDOS,
+)
+from gmp.consultas.exceptions import (
+    RenderizacaoIndisponivelError,
+    RenderizacaoTimeoutError,
+)
+from gmp.consultas.utils.modelo_receita import renderizar_receita
+
+# Com settings.RECEITA_PDF_PROCESSOS > 0, as receitas são renderizadas num
+# ProcessPoolExecutor, liberando a thread da requisição (e o GIL) durante o
+# ReportLab. Os jobs são dicionários simples (ver `renderizar_receita`). Cada
+# processo constrói o modelo da receita ao iniciar. A fila é limitada a
+# RECEITA_PDF_FILA_POR_PROCESSO jobs por processo: além disso, a requisição
+# falha na hora em vez de acumular trabalho. Um job só libera sua vaga quando
+# termina de fato, mesmo que a requisição já tenha desistido por timeout.
+
+_lock = threading.Lock()
+_executor = None
+_vagas = None
+
+
+def renderizar_pdf_receita(dados):
+    """Retorna os bytes do PDF da receita descrita por `dados`."""
+
+    processos = getattr(settings, "RECEITA_PDF_PROCESSOS", 0)
+
+    if not processos:
+        return renderizar_receita(dados)
+
+    executor, vagas = _obter_executor(processos)
+
+    if not vagas.acquire(blocking=False):
+        raise RenderizacaoIndisponivelError()
+
+    try:
+        futuro = executor.submit(renderizar_receita, dados)
+    except (BrokenProcessPool, RuntimeError):
+        vagas.release()
+        _descartar_executor(executor)
+        raise RenderizacaoIndisponivelError()
+
+    futuro.add_done_callback(lambda _: vagas.release())
+
+    try:
+        return futuro.result(timeout=RECEITA_PDF_TIMEOUT_SEGUNDOS)
+    except FuturesTimeoutError:
+        futuro.cancel()
+        raise RenderizacaoTimeoutError()
+    except BrokenProcessPool:
+        _descartar_executor(executor)
+        raise RenderizacaoIndisponivelError()
+
+
+def encerrar_processos():
+
+    with _lock:
+        executor = _executor
+        _limpar()
+
+    if executor is not None:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _obter_executor(processos):
+
+    global _executor, _vagas
+
+    with _lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=processos,
+                # spawn: os processos não herdam conexões nem threads do worker.
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_aquecer_processo,
+            )
+            _vagas = threading.BoundedSemaphore(
+                processos * RECEITA_PDF_FILA_POR_PROCESSO
+            )
+
+            # Um job vazio por processo força a criação (e o aquecimento) de
+            # todos eles antes da primeira receita real.
+            for _ in range(processos):
+                _executor.submit(int)
+
+        return _executor, _vagas
+
+
+def _descartar_executor(executor):
+
+    with _lock:
+        if _executor is executor:
+            _limpar()
+
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _limpar():
+    global _executor, _vagas
+
+    _executor = None
+    _vagas = None
+
+
+def _aquecer_processo():
+    # Monta o modelo e renderiza uma receita vazia para carregar fontes e
+    # caches do ReportLab antes do primeiro job.
+    renderizar_receita(
+        {
+            "medico_nome": "",
+            "crm": "",
+            "paciente_nome": "",
+            "paciente_idade": "",
+            "descricao": "",
+            "data": "",
+            "qr_payload": "0",
+        }
+    )
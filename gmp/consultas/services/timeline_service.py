@@ -0,0 +1,73 @@
+from gmp.consultas.constants import CACHE_TIMEOUT_TIMELINE
+from gmp.consultas.models import ConsultaLog
+from gmp.consultas.services.arquivo_log_service import logs_arquivados
+from gmp.consultas.services.cache_service import (
+    chave_versionada,
+    obter_ou_calcular,
+    timeout_compartilhado,
+)
+from gmp.consultas.utils.cache_keys import consulta_namespace, timeline_consulta_key
+from gmp.usuarios.models import CustomUser
+
+# A timeline de um agendamento é lida numa única consulta (índice
+# (consulta, criado_em), usuário via select_related) e fica em cache no
+# namespace da consulta, invalidado a cada novo log (ver
+# `cache_service.invalidar_timelines`). Transições feitas por outros
+# processos (comandos de expiração) só invalidam a timeline se o cache for
+# compartilhado; sem isso, ela expira em CACHE_TIMEOUT_LOCAL. Registros já
+# arquivados só são lidos quando há arquivo cuja faixa de consultas inclui o
+# agendamento.
+
+
+def timeline_consulta(consulta_id):
+    """Lista de transições do agendamento, da mais antiga à mais recente."""
+
+    chave = chave_versionada(
+        timeline_consulta_key(consulta_id), [consulta_namespace(consulta_id)]
+    )
+
+    return obter_ou_calcular(
+        chave,
+        lambda: _carregar_timeline(consulta_id),
+        timeout_compartilhado(CACHE_TIMEOUT_TIMELINE),
+    )
+
+
+def _carregar_timeline(consulta_id):
+
+    arquivados = logs_arquivados(consulta_id)
+    usuarios = CustomUser.objects.in_bulk(
+        {registro["usuario_id"] for registro in arquivados} - {None}
+    )
+
+    eventos = [
+        _evento(
+            registro["status_anterior"],
+            registro["status_novo"],
+            registro["criado_em"],
+            usuarios.get(registro["usuario_id"]),
+        )
+        for registro in arquivados
+    ]
+
+    eventos.extend(
+        _evento(log.status_anterior, log.status_novo, log.criado_em, log.usuario)
+        for log in ConsultaLog.objects.filter(consulta_id=consulta_id)
+        .select_related("usuario")
+        .order_by("criado_em", "id")
+    )
+
+    return eventos
+
+
+def _evento(status_anterior, status_novo, criado_em, usuario):
+    return {
+        "status_anterior": status_anterior,
+        "status_novo": status_novo,
+        "criado_em": criado_em,
+        "usuario": (
+            {"id": usuario.id, "nome": usuario.nome, "role": usuario.role}
+            if usuario
+            else None
+        ),
+    }
@@ -0,0 +1,160 @@
+from django.utils import timezone
+
+from gmp.consultas.constants import (
+    LOG_STATUS_INICIAL,
+    STATUS_CANCELADA,
+    STATUS_MARCADA,
+    STATUS_NAO_REALIZADA,
+    STATUS_REALIZADA,
+)
+from gmp.consultas.exceptions import ConsultaStatusInvalidoError
+from gmp.consultas.models import AgendamentoConsulta
+from gmp.consultas.services.cache_service import (
+    atualizar_ocupacao,
+    invalidar_ocupacoes_dos_dias,
+    sincronizar_ocupacao,
+)
+from gmp.consultas.services.contador_service import (
+    ajustar_contador,
+    descontar_contadores,
+    sincronizar_contador,
+)
+from gmp.consultas.services.log_service import registrar_log
+from gmp.consultas.services.proxima_consulta_service import (
+    sincronizar_proxima_consulta,
+    sincronizar_proximas_consultas,
+)
+
+# Ponto único de mudança de status de um agendamento. A transição é validada
+# contra TRANSICOES (sem reler o banco), gravada com um UPDATE condicionado
+# ao status anterior (duas transições concorrentes do mesmo agendamento não
+# passam ambas), emitida como ConsultaLog e aplicada às projeções derivadas
+# do status: ocupação em cache, contadores diários e a próxima consulta do
+# paciente (a timeline em cache é invalidada pelo próprio log). As funções
+# devem ser chamadas dentro de `transacao_auditada()`, de modo que status,
+# log e projeções sejam confirmados juntos.
+
+TRANSICOES = {
+    LOG_STATUS_INICIAL: frozenset({STATUS_MARCADA}),
+    STATUS_MARCADA: frozenset(
+        {STATUS_CANCELADA, STATUS_REALIZADA, STATUS_NAO_REALIZADA}
+    ),
+    STATUS_CANCELADA: frozenset(),
+    STATUS_REALIZADA: frozenset(),
+    STATUS_NAO_REALIZADA: frozenset(),
+}
+
+# Projeções de uma transição: recebem o agendamento já no novo estado e a
+# tupla (medico_id, data_hora, status) anterior, ou None na criação.
+PROJECOES = (sincronizar_ocupacao, sincronizar_contador, sincronizar_proxima_consulta)
+
+
+def validar_transicao(status_anterior, status_novo, mensagem=None):
+    if status_novo not in TRANSICOES.get(status_anterior, ()):
+        raise ConsultaStatusInvalidoError(mensagem)
+
+
+def transicionar(agendamento, status_novo, usuario, mensagem_erro=None, **campos):
+    """
+    Leva `agendamento` a `status_novo`, gravando também `campos`. Um
+    agendamento ainda não salvo é criado (transição inicial).
+    """
+
+    criacao = agendamento.pk is None
+    status_anterior = LOG_STATUS_INICIAL if criacao else agendamento.status
+
+    validar_transicao(status_anterior, status_novo, mensagem_erro)
+
+    anterior = (
+        None
+        if criacao
+        else (agendamento.medico_id, agendamento.data_hora, status_anterior)
+    )
+
+    if criacao:
+        agendamento.status = status_novo
+
+        for campo, valor in campos.items():
+            setattr(agendamento, campo, valor)
+
+        agendamento.save()
+    else:
+        campos["atualizado_em"] = timezone.now()
+
+        if status_novo == STATUS_CANCELADA:
+            campos.setdefault("cancelado_em", campos["atualizado_em"])
+
+        atualizados = AgendamentoConsulta.objects.filter(
+            pk=agendamento.pk, status=status_anterior
+        ).update(status=status_novo, **campos)
+
+        if not atualizados:
+            # Outra transição foi confirmada depois que o agendamento foi lido.
+            raise ConsultaStatusInvalidoError(mensagem_erro)
+
+        agendamento.status = status_novo
+
+        for campo, valor in campos.items():
+            setattr(agendamento, campo, valor)
+
+    registrar_log(
+        consulta=agendamento,
+        usuario=usuario,
+        status_anterior=status_anterior,
+        status_novo=status_novo,
+    )
+
+    for projetar in PROJECOES:
+        projetar(agendamento, anterior)
+
+    return agendamento
+
+
+def transicionar_lote(linhas, status_anterior, status_novo, usuario=None):
+    """
+    Emite os logs e atualiza as projeções de agendamentos que o chamador já
+    levou de `status_anterior` a `status_novo` com um UPDATE em massa.
+    `linhas` são tuplas (id, medico_id, data_hora).
+    """
+
+    validar_transicao(status_anterior, status_novo)
+
+    for agendamento_id, _, _ in linhas:
+        registrar_log(
+            consulta=AgendamentoConsulta(id=agendamento_id),
+            usuario=usuario,
+            status_anterior=status_anterior,
+            status_novo=status_novo,
+        )
+
+    if status_anterior == STATUS_MARCADA:
+        descontar_contadores(
+            [(medico_id, data_hora) for _, medico_id, data_hora in linhas]
+        )
+        invalidar_ocupacoes_dos_dias(
+            {timezone.localdate(data_hora) for _, _, data_hora in linhas}
+        )
+        sincronizar_proximas_consultas(
+            [agendamento_id for agendamento_id, _, _ in linhas]
+        )
+
+
+def reprojetar(agendamento, anterior):
+    """
+    Atualiza as projeções após uma alteração de médico ou horário, sem
+    mudança de status.
+    """
+
+    for projetar in PROJECOES:
+        projetar(agendamento, anterior)
+
+
+def remover_agendamento(agendamento):
+
+    agendamento.delete()
+
+    atualizar_ocupacao(agendamento.medico_id, agendamento.data_hora, ocupado=False)
+
+    if agendamento.status == STATUS_MARCADA:
+        ajustar_contador(agendamento.medico_id, agendamento.data_hora, -1)
+        sincronizar_proxima_consulta(agendamento)
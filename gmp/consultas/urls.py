@@ -19,6 +19,12 @@ urlpatterns = [
     path(
         "horarios-disponiveis/", views.horarios_disponiveis, name="horarios_disponiveis"
     ),
+    path(
+        "horarios-disponiveis/periodo/",
+        views.horarios_disponiveis_periodo,
+        name="horarios_disponiveis_periodo",
+    ),
+    path("dias-lotados/", views.dias_lotados, name="dias_lotados"),
     path(
         "cancelar/<int:consulta_id>/", views.cancelar_consulta, name="cancelar_consulta"
     ),
@@ -1,2 +1,30 @@
-def horarios_medico_key(medico_id: int, data_str: str) -> str:
-    return f"horarios_{medico_id}_{data_str}"
+def ocupacao_medico_key(medico_id: int, data_str: str) -> str:
+    return f"ocupacao_{medico_id}_{data_str}"
+
+
+def revisao_key(key: str) -> str:
+    return f"{key}_revisao"
+
+
+def lock_key(key: str) -> str:
+    return f"{key}_lock"
+
+
+def recalculo_key(key: str) -> str:
+    return f"{key}_recalculo"
+
+
+def timeline_consulta_key(consulta_id: int) -> str:
+    return f"timeline_{consulta_id}"
+
+
+def namespace_key(namespace: str) -> str:
+    return f"namespace_{namespace}"
+
+
+def consulta_namespace(consulta_id: int) -> str:
+    return f"consulta_{consulta_id}"
+
+
+def dia_namespace(data_str: str) -> str:
+    return f"dia_{data_str}"
@@ -0,0 +1,53 @@
+import threading
+from collections import OrderedDict
+
+
+class CacheLRU:
+    """
+    Cache em memória de valores `bytes` limitado pelo total de bytes
+    armazenados. Ao exceder o limite, descarta as entradas usadas há mais
+    tempo.
+    """
+
+    def __init__(self, limite_bytes):
+        self.limite_bytes = limite_bytes
+        self.total_bytes = 0
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def get(self, chave):
+
+        with self._lock:
+            valor = self._entradas.get(chave)
+
+            if valor is not None:
+                self._entradas.move_to_end(chave)
+
+            return valor
+
+    def set(self, chave, valor):
+
+        if len(valor) > self.limite_bytes:
+            return
+
+        with self._lock:
+            anterior = self._entradas.pop(chave, None)
+
+            if anterior is not None:
+                self.total_bytes -= len(anterior)
+
+            self._entradas[chave] = valor
+            self.total_bytes += len(valor)
+
+            while self.total_bytes > self.limite_bytes:
+                _, descartado = self._entradas.popitem(last=False)
+                self.total_bytes -= len(descartado)
+
+    def clear(self):
+
+        with self._lock:
+            self._entradas.clear()
+            self.total_bytes = 0
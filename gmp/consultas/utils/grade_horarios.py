@@ -0,0 +1,123 @@
+from bisect import bisect_left
+from datetime import datetime, time, timedelta
+from datetime import timezone as dt_timezone
+from functools import lru_cache
+from types import MappingProxyType
+
+from django.utils import timezone
+
+from gmp.consultas.constants import (
+    FORMATO_HORA,
+    HORA_FIM_ATENDIMENTO,
+    HORA_INICIO_ATENDIMENTO,
+    INTERVALO_MINUTOS,
+)
+
+# Grade de horários de atendimento, calculada uma única vez por processo e
+# compartilhada por formulários, serviços e serializers. Cada dia de
+# atendimento de um médico é representado por uma máscara de bits de largura
+# fixa: o bit i corresponde ao i-ésimo horário da grade abaixo.
+
+HORARIOS_GRADE = tuple(
+    time(h, m)
+    for h in range(HORA_INICIO_ATENDIMENTO, HORA_FIM_ATENDIMENTO)
+    for m in sorted(INTERVALO_MINUTOS)
+)
+
+TOTAL_HORARIOS = len(HORARIOS_GRADE)
+
+MASCARA_COMPLETA = (1 << TOTAL_HORARIOS) - 1
+
+OFFSETS_MINUTOS = tuple(h.hour * 60 + h.minute for h in HORARIOS_GRADE)
+
+HORARIOS_FORMATADOS = tuple(h.strftime(FORMATO_HORA) for h in HORARIOS_GRADE)
+
+INDICE_POR_HORARIO = MappingProxyType(
+    {(h.hour, h.minute): i for i, h in enumerate(HORARIOS_GRADE)}
+)
+
+INDICE_POR_FORMATADO = MappingProxyType(
+    {formatado: i for i, formatado in enumerate(HORARIOS_FORMATADOS)}
+)
+
+CHOICES_HORARIOS = tuple((h, h) for h in HORARIOS_FORMATADOS)
+
+
+@lru_cache(maxsize=512)
+def instantes_do_dia(data) -> tuple:
+    """Instantes (UTC) de cada horário da grade na data local informada."""
+
+    return tuple(
+        timezone.make_aware(datetime.combine(data, h)).astimezone(dt_timezone.utc)
+        for h in HORARIOS_GRADE
+    )
+
+
+@lru_cache(maxsize=512)
+def intervalo_do_dia(data) -> tuple:
+    """Intervalo [início, fim) em UTC que corresponde à data local informada."""
+
+    return tuple(
+        timezone.make_aware(datetime.combine(dia, time.min)).astimezone(dt_timezone.utc)
+        for dia in (data, data + timedelta(days=1))
+    )
+
+
+def instante_do_horario(data, hora_str):
+    indice = INDICE_POR_FORMATADO.get(hora_str)
+
+    if indice is None:
+        return None
+
+    return instantes_do_dia(data)[indice]
+
+
+def esta_na_grade(data_hora) -> bool:
+    return bool(bit_do_horario(data_hora)) and not (
+        data_hora.second or data_hora.microsecond
+    )
+
+
+def bit_do_horario(data_hora) -> int:
+    local = timezone.localtime(data_hora)
+    indice = INDICE_POR_HORARIO.get((local.hour, local.minute))
+
+    if indice is None:
+        return 0
+
+    return 1 << indice
+
+
+def mascara_dos_horarios(datas_horas) -> int:
+    mascara = 0
+
+    for data_hora in datas_horas:
+        mascara |= bit_do_horario(data_hora)
+
+    return mascara
+
+
+def mascara_antecedencia(data, minimo) -> int:
+    minimo_local = timezone.localtime(minimo)
+    data_minima = minimo_local.date()
+
+    if data > data_minima:
+        return MASCARA_COMPLETA
+
+    if data < data_minima:
+        return 0
+
+    minutos = minimo_local.hour * 60 + minimo_local.minute
+    if minimo_local.second or minimo_local.microsecond:
+        minutos += 1
+
+    primeiro = bisect_left(OFFSETS_MINUTOS, minutos)
+
+    return MASCARA_COMPLETA & ~((1 << primeiro) - 1)
+
+
+@lru_cache(maxsize=4096)
+def horarios_da_mascara(mascara: int) -> tuple:
+    return tuple(
+        HORARIOS_FORMATADOS[i] for i in range(TOTAL_HORARIOS) if mascara >> i & 1
+    )
@@ -0,0 +1,191 @@
+import copy
+import itertools
+from functools import lru_cache
+from io import BytesIO
+
+from reportlab.graphics.barcode import qr
+from reportlab.graphics.shapes import Drawing, Path
+from reportlab.lib import colors
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.platypus import (
+    HRFlowable,
+    PageBreak,
+    Paragraph,
+    SimpleDocTemplate,
+    Spacer,
+)
+
+# Layout da receita em PDF. Estilos e flowables estáticos (título, régua,
+# cabeçalho da descrição, linha de assinatura) são montados uma única vez por
+# processo; cada renderização recebe cópias rasas deles, já que o platypus
+# grava estado de layout nos flowables, e só cria os campos dinâmicos.
+# O documento é gerado em modo `invariant` (sem data de criação nem ID
+# aleatório), então os mesmos dados produzem sempre os mesmos bytes.
+#
+# O QR code é codificado uma vez por payload (LRU) e desenhado como um único
+# Path com um retângulo por sequência de módulos escuros de cada linha, em vez
+# de um Rect por sequência dentro de um Group, como faz o QrCodeWidget.
+
+TAMANHO_QR = 100
+BORDA_QR = 4
+LIMITE_CACHE_QR = 1024
+
+_MOVER, _LINHA, _FECHAR = 0, 1, 3
+
+
+class ModeloReceita:
+
+    # Incrementar ao mudar o layout: invalida os previews em cache.
+    VERSAO = 2
+
+    def __init__(self):
+        styles = getSampleStyleSheet()
+
+        self.normal_style = styles["Normal"]
+
+        titulo_style = ParagraphStyle(
+            "Titulo",
+            parent=styles["Heading1"],
+            textColor=colors.HexColor("#065f46"),
+            fontSize=18,
+        )
+
+        self.titulo = Paragraph("G.M.P - Receita Médica", titulo_style)
+        self.regua = HRFlowable(width="100%", thickness=1, color=colors.grey)
+        self.cabecalho_descricao = Paragraph(
+            "Descrição da Receita:", styles["Heading3"]
+        )
+        self.assinatura = Paragraph(
+            "Assinatura: ________________________________", self.normal_style
+        )
+
+    def renderizar(self, buffer, **dados):
+        return self.renderizar_varias(buffer, [dados])
+
+    def renderizar_varias(self, buffer, receitas):
+        """Renderiza cada dicionário de `receitas` em sua própria página."""
+
+        doc = SimpleDocTemplate(
+            buffer,
+            rightMargin=40,
+            leftMargin=40,
+            topMargin=60,
+            bottomMargin=40,
+            invariant=1,
+        )
+
+        elementos = []
+
+        for dados in receitas:
+            if elementos:
+                elementos.append(PageBreak())
+
+            elementos.extend(self._elementos(**dados))
+
+        doc.build(elementos)
+
+        return buffer
+
+    def _elementos(
+        self,
+        medico_nome,
+        crm,
+        paciente_nome,
+        paciente_idade,
+        descricao,
+        data,
+        qr_payload,
+    ):
+        return [
+            copy.copy(self.titulo),
+            Spacer(1, 0.3 * inch),
+            self._paragrafo(f"Médico: {medico_nome}"),
+            self._paragrafo(f"CRM: {crm}"),
+            Spacer(1, 0.2 * inch),
+            self._paragrafo(f"Paciente: {paciente_nome}"),
+            self._paragrafo(f"Idade: {paciente_idade}"),
+            Spacer(1, 0.2 * inch),
+            copy.copy(self.regua),
+            Spacer(1, 0.2 * inch),
+            copy.copy(self.cabecalho_descricao),
+            Spacer(1, 0.2 * inch),
+            self._paragrafo(descricao.replace("\n", "<br/>")),
+            Spacer(1, 0.5 * inch),
+            self._paragrafo(f"Data: {data}"),
+            Spacer(1, 0.5 * inch),
+            copy.copy(self.assinatura),
+            Spacer(1, 0.5 * inch),
+            self._qr_code(qr_payload),
+        ]
+
+    def _paragrafo(self, texto):
+        return Paragraph(texto, self.normal_style)
+
+    def _qr_code(self, payload):
+
+        drawing = Drawing(TAMANHO_QR, TAMANHO_QR)
+
+        # Previews ainda não têm protocolo: o espaço do QR fica em branco.
+        if payload:
+            pontos, operadores = caminho_qr(payload)
+            drawing.add(
+                Path(
+                    list(pontos),
+                    list(operadores),
+                    fillColor=colors.black,
+                    strokeColor=None,
+                )
+            )
+
+        return drawing
+
+
+@lru_cache(maxsize=LIMITE_CACHE_QR)
+def caminho_qr(payload):
+    """
+    Pontos e operadores do Path que desenha o QR de `payload` num quadrado de
+    TAMANHO_QR, com BORDA_QR módulos de margem.
+    """
+
+    codigo = qr.QrCodeWidget(payload).qr
+    codigo.make()
+
+    modulo = TAMANHO_QR / (codigo.getModuleCount() + BORDA_QR * 2)
+    pontos = []
+    operadores = []
+
+    for linha, modulos in enumerate(codigo.modules):
+        topo = TAMANHO_QR - (linha + BORDA_QR) * modulo
+        base = topo - modulo
+        coluna = BORDA_QR
+
+        for escuro, sequencia in itertools.groupby(map(bool, modulos)):
+            comprimento = len(list(sequencia))
+
+            if escuro:
+                esquerda = coluna * modulo
+                direita = esquerda + comprimento * modulo
+                pontos.extend(
+                    (esquerda, base, direita, base, direita, topo, esquerda, topo)
+                )
+                operadores.extend((_MOVER, _LINHA, _LINHA, _LINHA, _FECHAR))
+
+            coluna += comprimento
+
+    return tuple(pontos), tuple(operadores)
+
+
+@lru_cache(maxsize=1)
+def modelo_receita():
+    return ModeloReceita()
+
+
+def renderizar_receita(dados):
+    """
+    Renderiza a receita a partir de um dicionário simples com os argumentos
+    de `ModeloReceita.renderizar` (exceto o buffer) e retorna os bytes do PDF.
+    Não depende de models, então pode rodar em outro processo.
+    """
+
+    return modelo_receita().renderizar(BytesIO(), **dados).getvalue()
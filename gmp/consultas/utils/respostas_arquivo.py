@@ -0,0 +1,117 @@
+import re
+
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+# Resposta para arquivos imutáveis do storage com requisições condicionais
+# (If-None-Match / If-Modified-Since → 304) e parciais (Range → 206). Só um
+# intervalo por requisição é atendido; pedidos com vários intervalos, ou com
+# If-Range que não corresponde à versão atual, recebem o arquivo inteiro,
+# como permite a RFC 9110.
+
+TAMANHO_BLOCO = 64 * 1024
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def resposta_arquivo(request, arquivo, etag, modificado_em, nome, content_type):
+
+    etag = quote_etag(etag)
+    ultima_modificacao = int(modificado_em.timestamp())
+
+    response = get_conditional_response(
+        request, etag=etag, last_modified=ultima_modificacao
+    )
+
+    if response is None:
+        tamanho = arquivo.size
+        intervalo = _intervalo(request, etag, tamanho)
+
+        if intervalo is None:
+            response = FileResponse(
+                arquivo.open("rb"), content_type=content_type, filename=nome
+            )
+        elif intervalo is False:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{tamanho}"
+        else:
+            inicio, fim = intervalo
+            response = StreamingHttpResponse(
+                _ler_intervalo(arquivo, inicio, fim),
+                status=206,
+                content_type=content_type,
+            )
+            response["Content-Length"] = str(fim - inicio + 1)
+            response["Content-Range"] = f"bytes {inicio}-{fim}/{tamanho}"
+            response["Content-Disposition"] = f'inline; filename="{nome}"'
+
+        response["Accept-Ranges"] = "bytes"
+
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(ultima_modificacao)
+    response["Cache-Control"] = "private, no-cache"
+
+    return response
+
+
+def _intervalo(request, etag, tamanho):
+    """
+    (início, fim) inclusivos do Range pedido; None para servir o arquivo
+    inteiro e False se o intervalo não puder ser atendido.
+    """
+
+    cabecalho = request.headers.get("Range")
+
+    if not cabecalho:
+        return None
+
+    if_range = request.headers.get("If-Range")
+
+    if if_range and if_range != etag:
+        return None
+
+    correspondencia = _RANGE.match(cabecalho.strip())
+
+    if not correspondencia:
+        return None
+
+    inicio, fim = correspondencia.groups()
+
+    if not inicio and not fim:
+        return None
+
+    if not inicio:
+        # Sufixo: os últimos `fim` bytes.
+        if not int(fim):
+            return False
+
+        return max(tamanho - int(fim), 0), tamanho - 1
+
+    inicio = int(inicio)
+
+    if inicio >= tamanho:
+        return False
+
+    fim = min(int(fim), tamanho - 1) if fim else tamanho - 1
+
+    if fim < inicio:
+        return None
+
+    return inicio, fim
+
+
+def _ler_intervalo(arquivo, inicio, fim):
+
+    with arquivo.open("rb") as leitura:
+        leitura.seek(inicio)
+        restante = fim - inicio + 1
+
+        while restante > 0:
+            bloco = leitura.read(min(TAMANHO_BLOCO, restante))
+
+            if not bloco:
+                break
+
+            restante -= len(bloco)
+            yield bloco
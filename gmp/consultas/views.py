@@ -3,9 +3,10 @@ from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import PermissionDenied
 from django.core.paginator import Paginator
-from django.http import HttpResponse, JsonResponse
+from django.http import Http404, HttpResponse, HttpResponseNotModified, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.utils import timezone
+from django.utils.http import parse_etags
 from django.utils.timezone import localdate
 
 from gmp.consultas.constants import (
@@ -19,17 +20,26 @@ from gmp.consultas.constants import (
     URL_AGENDA_MEDICO,
     URL_MINHAS_CONSULTAS,
 )
-from gmp.consultas.exceptions import ConsultaError
+from gmp.consultas.exceptions import (
+    ConsultaError,
+    DadosReceitaInvalidosError,
+    RenderizacaoIndisponivelError,
+)
 from gmp.consultas.services.consulta_service import (
     cancelar_consulta_service,
     marcar_consulta_service,
     registrar_consulta_service,
 )
-from gmp.consultas.services.horarios_service import horarios_disponiveis_service
+from gmp.consultas.services.horarios_service import (
+    dias_lotados_service,
+    horarios_disponiveis_periodo_service,
+    horarios_disponiveis_service,
+)
 from gmp.consultas.services.receita_service import (
     gerar_receita_preview_service,
-    validar_visualizacao_receita_service,
+    receita_pdf_service,
 )
+from gmp.consultas.utils.respostas_arquivo import resposta_arquivo
 from gmp.usuarios.models import CustomUser
 
 from .decorators import role_required
@@ -102,6 +112,38 @@ def horarios_disponiveis(request):
     return JsonResponse(horarios, safe=False)
 
 
+@login_required
+def horarios_disponiveis_periodo(request):
+
+    medicos = request.GET.get("medicos", "")
+    inicio = request.GET.get("inicio")
+    fim = request.GET.get("fim")
+
+    try:
+        horarios = horarios_disponiveis_periodo_service(
+            [medico for medico in medicos.split(",") if medico], inicio, fim
+        )
+    except ConsultaError as e:
+        return JsonResponse({"erro": str(e)}, status=400)
+
+    return JsonResponse(horarios)
+
+
+@login_required
+def dias_lotados(request):
+
+    medico_id = request.GET.get("medico")
+    inicio = request.GET.get("inicio")
+    fim = request.GET.get("fim")
+
+    try:
+        dias = dias_lotados_service(medico_id, inicio, fim)
+    except ConsultaError as e:
+        return JsonResponse({"erro": str(e)}, status=400)
+
+    return JsonResponse(dias, safe=False)
+
+
 @login_required
 @role_required(CustomUser.ROLE_MEDICO, CustomUser.ROLE_SUPERADM)
 def agenda_medico(request):
@@ -145,15 +187,26 @@ def agenda_medico(request):
 def minhas_consultas(request):
 
     consultas = consultas_do_paciente(request.user)
+    agora = timezone.now()
 
     paginator = Paginator(consultas, PAGINACAO_PADRAO)
     page_number = request.GET.get("page")
     page_obj = paginator.get_page(page_number)
 
+    proxima_consulta_id = (
+        request.user.proxima_consulta_id
+        if request.user.possui_consulta_futura(agora)
+        else None
+    )
+
     return render(
         request,
         "gmp/minhas_consultas.html",
-        {"page_obj": page_obj, "now": timezone.now()},
+        {
+            "page_obj": page_obj,
+            "now": agora,
+            "proxima_consulta_id": proxima_consulta_id,
+        },
     )
 
 
@@ -221,20 +274,13 @@ def historico_medico_consultas(request):
     if not medico_ou_superadmin(request.user):
         raise PermissionDenied(MSG_ERRO_SEM_PERMISSAO)
 
-    consultas = consultas_realizadas_por_medico(request.user)
-
     data = request.GET.get("data")
     paciente_id = request.GET.get("paciente_id")
     queixa = request.GET.get("queixa")
 
-    if data:
-        consultas = consultas.filter(data_hora__date=data)
-
-    if paciente_id:
-        consultas = consultas.filter(paciente_id=paciente_id)
-
-    if queixa:
-        consultas = consultas.filter(paciente__queixa=queixa)
+    consultas = consultas_realizadas_por_medico(
+        request.user, data=data, paciente_id=paciente_id, queixa=queixa
+    )
 
     pacientes = pacientes_com_consulta_realizada_do_medico(request.user)
 
@@ -288,11 +334,15 @@ def visualizar_receita(request, consulta_id):
     agendamento = get_object_or_404(consulta_por_id(consulta_id))
 
     try:
-        consulta = validar_visualizacao_receita_service(agendamento, request.user)
+        arquivo = receita_pdf_service(agendamento, request.user)
+    except DadosReceitaInvalidosError:
+        raise Http404
+    except RenderizacaoIndisponivelError as e:
+        return HttpResponse(str(e), status=503)
     except ConsultaError as e:
         raise PermissionDenied(str(e))
 
-    return render(request, "gmp/receita.html", {"consulta": consulta})
+    return resposta_arquivo(request, **arquivo)
 
 
 @login_required
@@ -304,13 +354,26 @@ def gerar_receita_preview(request, agendamento_id):
     descricao = request.GET.get("descricao")
 
     try:
-        pdf_buffer = gerar_receita_preview_service(
-            agendamento, request.user, crm, descricao
+        etag, pdf = gerar_receita_preview_service(
+            agendamento,
+            request.user,
+            crm,
+            descricao,
+            etags_cliente=parse_etags(request.headers.get("If-None-Match", "")),
         )
 
-        response = HttpResponse(pdf_buffer, content_type="application/pdf")
-        response["Content-Disposition"] = 'inline; filename="receita_preview.pdf"'
+        if pdf is None:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(pdf, content_type="application/pdf")
+            response["Content-Disposition"] = 'inline; filename="receita_preview.pdf"'
+
+        response["ETag"] = etag
+        response["Cache-Control"] = "private, no-cache"
         return response
 
+    except RenderizacaoIndisponivelError as e:
+        return HttpResponse(str(e), status=503)
+
     except ConsultaError as e:
         return HttpResponse(str(e), status=400)
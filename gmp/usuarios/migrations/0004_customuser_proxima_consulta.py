@@ -0,0 +1,48 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:09
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+
+def popular_proxima_consulta(apps, schema_editor):
+    AgendamentoConsulta = apps.get_model("consultas", "AgendamentoConsulta")
+    CustomUser = apps.get_model("usuarios", "CustomUser")
+
+    ultima_marcada = AgendamentoConsulta.objects.filter(
+        paciente=OuterRef("pk"), status="marcada"
+    ).order_by("-data_hora", "-id")
+
+    CustomUser.objects.filter(role="paciente").update(
+        proxima_consulta=Subquery(ultima_marcada.values("id")[:1]),
+        proxima_consulta_em=Subquery(ultima_marcada.values("data_hora")[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("consultas", "0019_consultalog_consulta_criado_em_idx"),
+        ("usuarios", "0003_alter_customuser_telefone"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="customuser",
+            name="proxima_consulta",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="consultas.agendamentoconsulta",
+            ),
+        ),
+        migrations.AddField(
+            model_name="customuser",
+            name="proxima_consulta_em",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(popular_proxima_consulta, migrations.RunPython.noop),
+    ]
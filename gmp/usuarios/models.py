@@ -132,6 +132,21 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
 
     date_joined = models.DateTimeField(default=timezone.now)
 
+    # Agendamento marcado mais distante do paciente, mantido pelas transições
+    # de status. Como o paciente só pode ter uma consulta futura marcada, ele
+    # é a próxima consulta quando `proxima_consulta_em` está no futuro.
+    proxima_consulta = models.ForeignKey(
+        "consultas.AgendamentoConsulta",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name="+",
+    )
+    proxima_consulta_em = models.DateTimeField(null=True, blank=True, editable=False)
+
+    CAMPOS_DERIVADOS = ("proxima_consulta", "proxima_consulta_em")
+
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = []
 
@@ -149,7 +164,22 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
             self.is_superuser = False
             self.is_staff = False
 
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            # O ponteiro da próxima consulta só é gravado pelas transições de
+            # agendamento; um save completo de um usuário lido antes delas
+            # sobrescreveria o valor atual com o antigo.
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.CAMPOS_DERIVADOS
+            ]
+
         super().save(*args, **kwargs)
 
+    def possui_consulta_futura(self, agora=None):
+        return self.proxima_consulta_em is not None and self.proxima_consulta_em > (
+            agora or timezone.now()
+        )
+
     def __str__(self):
         return self.nome if self.nome else self.email
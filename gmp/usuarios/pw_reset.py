@@ -1,3 +1,5 @@
+import logging
+
 from django import forms
 from django.contrib.auth.forms import PasswordResetForm, SetPasswordForm
 from django.contrib.auth.views import (
@@ -6,8 +8,14 @@ from django.contrib.auth.views import (
     PasswordResetDoneView,
     PasswordResetView,
 )
+from django.core.mail import EmailMultiAlternatives
+from django.template import loader
 from django.utils.translation import gettext_lazy as _
 
+from gmp.consultas.services.email_service import enviar_mensagens, fechar_conexao
+
+logger = logging.getLogger(__name__)
+
 
 class CustomPasswordResetCompleteView(PasswordResetCompleteView):
     template_name = "gmp/pw_reset_complete.html"
@@ -26,6 +34,40 @@ class CustomPasswordResetForm(PasswordResetForm):
         ),
     )
 
+    def send_mail(
+        self,
+        subject_template_name,
+        email_template_name,
+        context,
+        from_email,
+        to_email,
+        html_email_template_name=None,
+    ):
+        # Mesmo conteúdo do PasswordResetForm, mas enviado pelo serviço de
+        # e-mail. O envio acontece numa thread da requisição, então a conexão
+        # é fechada logo em seguida em vez de ficar aberta até o próximo uso.
+        subject = loader.render_to_string(subject_template_name, context)
+        subject = "".join(subject.splitlines())
+        body = loader.render_to_string(email_template_name, context)
+
+        mensagem = EmailMultiAlternatives(subject, body, from_email, [to_email])
+
+        if html_email_template_name is not None:
+            html_email = loader.render_to_string(html_email_template_name, context)
+            mensagem.attach_alternative(html_email, "text/html")
+
+        try:
+            falhas = enviar_mensagens([mensagem])
+        finally:
+            fechar_conexao()
+
+        for _indice, erro in falhas:
+            logger.warning(
+                "Falha ao enviar e-mail de redefinição de senha para @%s: %s",
+                to_email.rpartition("@")[2],
+                erro,
+            )
+
 
 class CustomSetPasswordForm(SetPasswordForm):
     new_password1 = forms.CharField(